@@ -1,10 +1,70 @@
+import hashlib
 import json
+
+import pandas as pd
 import streamlit as st
 
-from src.agent_orchestrator import build_case_report
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from src.agent_orchestrator import (
+    build_case_report,
+    _get_chroma_collection_name,
+    _get_chroma_path,
+    _get_collection,
+    _get_embedder,
+    _json_default,
+)
 
 st.set_page_config(page_title="Fraud AI Agent", layout="wide")
 
+
+@st.cache_resource
+def _embedder():
+    try:
+        return _get_embedder()
+    except Exception:
+        return None
+
+
+@st.cache_resource
+def _chroma_collection():
+    # Shared across sessions and reruns; the orchestrator reuses the same handle.
+    try:
+        return _get_collection(_get_chroma_path(), _get_chroma_collection_name())
+    except Exception:
+        return None
+
+
+@st.cache_data(ttl="5m", max_entries=256)
+def _cached_case_report(tx_id: int, top_k: int) -> dict:
+    # The console always shows precedent, even when proba alone decides.
+    return build_case_report(tx_id, top_k=top_k, force_retrieve=True)
+
+
+@st.cache_data(max_entries=32)
+def _serialize_report(report_hash: str, _report: dict) -> bytes:
+    # _report is not hashed by Streamlit; report_hash is the cache key.
+    # Bytes go straight to download_button without another str -> utf-8 encode.
+    if orjson is not None:
+        return orjson.dumps(
+            _report,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+            default=_json_default,
+        )
+    return json.dumps(_report, indent=2, default=_json_default).encode("utf-8")
+
+
+def _report_hash(report: dict) -> str:
+    return hashlib.blake2b(repr(sorted(report.items())).encode()).hexdigest()
+
+
+# Load the embedding model and open the collection at startup, not on the first click.
+_embedder()
+_chroma_collection()
+
 st.title("Fraud AI Agent Investigator Console")
 st.caption("Model and Evidence Tools and Similar Case Retrieval using Chroma")
 
@@ -22,9 +82,33 @@ def _format_rate(x):
     except Exception:
         return  "N A"
 
+
+@st.fragment
+def _similar_cases_section(rows):
+    # Runs as its own fragment so table interaction does not rerun the page.
+    if rows:
+        df = pd.DataFrame(rows, columns=["transaction_id", "label", "distance", "document"])
+        df["distance"] = pd.to_numeric(df["distance"], errors="coerce").round(4)
+        st.dataframe(df, use_container_width=True, height=380)
+    else:
+        st.info("No similar cases found. Build the vector store first using python -m src.similar_cases")
+
+
+@st.fragment
+def _download_section(report, tx_id):
+    # A download click reruns only this fragment, not the whole investigation.
+    report_bytes = _serialize_report(_report_hash(report), report)
+    st.download_button(
+        label="Download JSON",
+        data=report_bytes,
+        file_name=f"case_{tx_id}.json",
+        mime="application/json",
+    )
+
+
 if run_btn:
     with st.spinner("Running agent..."):
-        report = build_case_report(int(tx_id), top_k=int(top_k))
+        report = _cached_case_report(int(tx_id), int(top_k))
 
     stats = report.get("neighbor_stats", {})
 
@@ -64,21 +148,7 @@ if run_btn:
 
     with right:
         st.subheader("Similar Cases")
-        rows = report.get("similar_cases", [])
-        if rows:
-            table_rows = []
-            for r in rows:
-                table_rows.append(
-                    {
-                        "transaction_id": r.get("transaction_id"),
-                        "label": r.get("label"),
-                        "distance": round(float(r.get("distance", 0.0)), 4) if r.get("distance") is not None else None,
-                        "document": r.get("document"),
-                    }
-                )
-            st.dataframe(table_rows, use_container_width=True, height=380)
-        else:
-            st.info("No similar cases found. Build the vector store first using python -m src.similar_cases")
+        _similar_cases_section(report.get("similar_cases", []))
 
         st.subheader("Explanation")
         explanation = report.get("explanation", {})
@@ -93,13 +163,7 @@ if run_btn:
     st.divider()
 
     st.subheader("Download Report")
-    report_json = json.dumps(report, indent=2)
-    st.download_button(
-        label="Download JSON",
-        data=report_json,
-        file_name=f"case_{tx_id}.json",
-        mime="application/json",
-    )
+    _download_section(report, tx_id)
 
 else:
     st.info("Enter a TransactionID and click Run Investigation.")
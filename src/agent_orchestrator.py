@@ -1,15 +1,30 @@
 import json
 import os
-from dataclasses import dataclass
+import threading
+from dataclasses import asdict, dataclass, is_dataclass
+from functools import lru_cache
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
+import numpy as np
+
+try:
+    from numba import njit
+except Exception:
+    # numba is optional; without it the kernels below run as plain Python.
+    def njit(*args: Any, **kwargs: Any) -> Any:
+        return lambda fn: fn
+
 try:
     from .evidence import build_evidence
+    from .onnx_embedder import OnnxEmbedder, onnx_model_dir
     from .scoring import score_transaction
+    from .vector_index import BinaryIndex, IVFPQIndex, cases_path, ivfpq_path
 except Exception:
     from src.evidence import build_evidence
+    from src.onnx_embedder import OnnxEmbedder, onnx_model_dir
     from src.scoring import score_transaction
+    from src.vector_index import BinaryIndex, IVFPQIndex, cases_path, ivfpq_path
 
 
 def utc_now_iso_z() -> str:
@@ -32,6 +47,17 @@ def _coerce_score_to_proba(score_out: Any) -> float:
     return float(score_out)
 
 
+def _json_default(o: Any) -> Any:
+    """json.dumps default= hook for dataclasses and numpy values in reports."""
+    if is_dataclass(o) and not isinstance(o, type):
+        return asdict(o)
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    return str(o)
+
+
 def _safe_float(x: Any, default: Optional[float] = None) -> Optional[float]:
     try:
         if x is None:
@@ -41,22 +67,42 @@ def _safe_float(x: Any, default: Optional[float] = None) -> Optional[float]:
         return default
 
 
+# Evidence and model score are pure functions of the TransactionID for a fixed
+# dataset + model. Like the model artifact and the DuckDB connection they are
+# kept for the life of the process, so restart after rebuilding either.
+@lru_cache(maxsize=4096)
+def _cached_evidence(tx_id: int) -> Dict[str, Any]:
+    return build_evidence(tx_id)
+
+
+@lru_cache(maxsize=4096)
+def _cached_proba(tx_id: int) -> float:
+    return _coerce_score_to_proba(score_transaction(tx_id))
+
+
+_QUERY_KEYS = (
+    "amount",
+    "ProductCD",
+    "card1",
+    "addr1",
+    "P_emaildomain",
+    "R_emaildomain",
+    "DeviceType",
+    "entity_key_used",
+    "entity_tx_count_10m",
+    "entity_tx_count_1h",
+    "entity_tx_count_24h",
+    "identity_missing_ratio",
+)
+
+_QUERY_TEMPLATE = (
+    "amount={} | ProductCD={} | card1={} | addr1={} | P_emaildomain={} | R_emaildomain={} | "
+    "DeviceType={} | entity_key={} | v10={} | v1h={} | v24h={} | identity_missing_ratio={}"
+)
+
+
 def _build_query_text(evidence: Dict[str, Any]) -> str:
-    parts = [
-        f"amount={evidence.get('amount')}",
-        f"ProductCD={evidence.get('ProductCD')}",
-        f"card1={evidence.get('card1')}",
-        f"addr1={evidence.get('addr1')}",
-        f"P_emaildomain={evidence.get('P_emaildomain')}",
-        f"R_emaildomain={evidence.get('R_emaildomain')}",
-        f"DeviceType={evidence.get('DeviceType')}",
-        f"entity_key={evidence.get('entity_key_used')}",
-        f"v10={evidence.get('entity_tx_count_10m')}",
-        f"v1h={evidence.get('entity_tx_count_1h')}",
-        f"v24h={evidence.get('entity_tx_count_24h')}",
-        f"identity_missing_ratio={evidence.get('identity_missing_ratio')}",
-    ]
-    return " | ".join(parts)
+    return _QUERY_TEMPLATE.format(*map(evidence.get, _QUERY_KEYS))
 
 
 @dataclass
@@ -70,150 +116,315 @@ class SignalResult:
     signal_reasons: List[str]
 
 
-def _compute_signals(evidence: Dict[str, Any]) -> SignalResult:
-    reasons: List[str] = []
+_SIG_HIGH_AMOUNT = 1
+_SIG_HIGH_VELOCITY_10M = 2
+_SIG_HIGH_VELOCITY_1H = 4
+_SIG_IDENTITY_MISSING_HEAVY = 8
+_SIG_EMAIL_MISMATCH = 16
+
+_SIGNAL_REASONS = (
+    (_SIG_HIGH_AMOUNT, "High amount threshold triggered."),
+    (_SIG_HIGH_VELOCITY_10M, "High velocity in 10m (>= 3)."),
+    (_SIG_HIGH_VELOCITY_1H, "High velocity in 1h (>= 5)."),
+    (_SIG_IDENTITY_MISSING_HEAVY, "Identity signals mostly missing (>= 95%)."),
+    (_SIG_EMAIL_MISMATCH, "P and R email domain mismatch."),
+)
+
+# Email domain -> small int id, so the kernel compares ints instead of strings.
+# Lives for the whole process (Streamlit reruns included), so ids stay stable.
+_EMAIL_ID: Dict[Any, int] = {}
+_EMAIL_ID_LOCK = threading.Lock()
+
+
+def _intern_email(value: Any) -> int:
+    if value is None:
+        return -1
+    # Known domains: one dict lookup, no str() copy and no lock.
+    eid = _EMAIL_ID.get(value)
+    if eid is None:
+        with _EMAIL_ID_LOCK:
+            eid = _EMAIL_ID.setdefault(value, len(_EMAIL_ID))
+    return eid
+
+
+@njit(cache=True)
+def _signals_kernel(
+    amount: float,
+    v10: int,
+    v1h: int,
+    miss_ratio: float,
+    p_email_id: int,
+    r_email_id: int,
+    amount_high_flag: bool,
+) -> Any:
+    """
+    Threshold logic of _compute_signals on plain scalars.
+    Returns (bitmask of _SIG_* flags, signal_score).
+    """
+    mask = 0
+    if amount_high_flag or amount >= 1000.0:
+        mask |= _SIG_HIGH_AMOUNT
+    if v10 >= 3:
+        mask |= _SIG_HIGH_VELOCITY_10M
+    if v1h >= 5:
+        mask |= _SIG_HIGH_VELOCITY_1H
+    if miss_ratio >= 0.95:
+        mask |= _SIG_IDENTITY_MISSING_HEAVY
+    if p_email_id >= 0 and r_email_id >= 0 and p_email_id != r_email_id:
+        mask |= _SIG_EMAIL_MISMATCH
+
+    score = 0
+    bits = mask
+    while bits:
+        score += bits & 1
+        bits >>= 1
+    return mask, score
 
+
+def _compute_signals(evidence: Dict[str, Any]) -> SignalResult:
     amount = _safe_float(evidence.get("amount"), default=0.0) or 0.0
     v10 = int(evidence.get("entity_tx_count_10m") or 0)
     v1h = int(evidence.get("entity_tx_count_1h") or 0)
     miss_ratio = _safe_float(evidence.get("identity_missing_ratio"), default=0.0) or 0.0
 
-    p_email = evidence.get("P_emaildomain")
-    r_email = evidence.get("R_emaildomain")
-
-    high_amount = bool(evidence.get("amount_high")) or amount >= 1000.0
-    if high_amount:
-        reasons.append("High amount threshold triggered.")
-
-    high_velocity_10m = v10 >= 3
-    if high_velocity_10m:
-        reasons.append("High velocity in 10m (>= 3).")
-
-    high_velocity_1h = v1h >= 5
-    if high_velocity_1h:
-        reasons.append("High velocity in 1h (>= 5).")
-
-    identity_missing_heavy = miss_ratio >= 0.95
-    if identity_missing_heavy:
-        reasons.append("Identity signals mostly missing (>= 95%).")
-
-    email_mismatch = (
-        p_email is not None
-        and r_email is not None
-        and str(p_email) != str(r_email)
+    mask, signal_score = _signals_kernel(
+        amount,
+        v10,
+        v1h,
+        miss_ratio,
+        _intern_email(evidence.get("P_emaildomain")),
+        _intern_email(evidence.get("R_emaildomain")),
+        bool(evidence.get("amount_high")),
     )
-    if email_mismatch:
-        reasons.append("P and R email domain mismatch.")
 
-    signal_score = 0
-    signal_score += 1 if high_amount else 0
-    signal_score += 1 if high_velocity_10m else 0
-    signal_score += 1 if high_velocity_1h else 0
-    signal_score += 1 if identity_missing_heavy else 0
-    signal_score += 1 if email_mismatch else 0
+    # Common ALLOW path: no flags, skip building the reasons list.
+    reasons = [text for bit, text in _SIGNAL_REASONS if mask & bit] if mask else []
 
     return SignalResult(
-        high_amount=high_amount,
-        high_velocity_10m=high_velocity_10m,
-        high_velocity_1h=high_velocity_1h,
-        identity_missing_heavy=identity_missing_heavy,
-        email_mismatch=email_mismatch,
-        signal_score=signal_score,
+        high_amount=bool(mask & _SIG_HIGH_AMOUNT),
+        high_velocity_10m=bool(mask & _SIG_HIGH_VELOCITY_10M),
+        high_velocity_1h=bool(mask & _SIG_HIGH_VELOCITY_1H),
+        identity_missing_heavy=bool(mask & _SIG_IDENTITY_MISSING_HEAVY),
+        email_mismatch=bool(mask & _SIG_EMAIL_MISMATCH),
+        signal_score=int(signal_score),
         signal_reasons=reasons,
     )
 
 
 def _get_chroma_path() -> str:
-    env_path = os.environ.get("FRAUD_AGENT_CHROMA_PATH")
+    return _resolve_chroma_path(
+        os.environ.get("FRAUD_AGENT_CHROMA_PATH"),
+        os.environ.get("LOCALAPPDATA"),
+    )
+
+
+# Keyed on the env values, so changing FRAUD_AGENT_CHROMA_PATH still takes effect.
+@lru_cache(maxsize=8)
+def _resolve_chroma_path(env_path: Optional[str], local_appdata: Optional[str]) -> str:
     if env_path:
         return env_path
 
-    local_appdata = os.environ.get("LOCALAPPDATA")
     if not local_appdata:
         local_appdata = os.path.expanduser("~")
 
     return os.path.join(local_appdata, "fraud_ai_agent_chroma")
 
 
+# Chroma paths already seen on disk. Only hits are remembered, so a store
+# built after startup is still picked up.
+_CHROMA_PATHS_SEEN: set = set()
+
+
+def _chroma_path_exists(chroma_path: str) -> bool:
+    if chroma_path in _CHROMA_PATHS_SEEN:
+        return True
+    if os.path.exists(chroma_path):
+        _CHROMA_PATHS_SEEN.add(chroma_path)
+        return True
+    return False
+
+
 def _get_chroma_collection_name() -> str:
     return os.environ.get("FRAUD_AGENT_CHROMA_COLLECTION", "fraud_cases")
 
 
+def _get_retrieval_backend() -> str:
+    return os.environ.get("FRAUD_AGENT_RETRIEVAL_BACKEND", "chroma").lower()
+
+
+@lru_cache(maxsize=8)
+def _get_index(chroma_path: str, collection_name: str, backend: str) -> Any:
+    """
+    Handle used for neighbor search: the Chroma collection, or a compact
+    index over the cases file similar_cases.py writes next to the Chroma
+    store (backend="binary" or "faiss").
+    """
+    if backend == "binary":
+        return BinaryIndex.load(cases_path(chroma_path, collection_name))
+    if backend == "faiss":
+        return IVFPQIndex.load(
+            ivfpq_path(chroma_path, collection_name),
+            cases_path(chroma_path, collection_name),
+        )
+    return _get_collection(chroma_path, collection_name)
+
+
+def _query_index(index: Any, embs: np.ndarray, top_k: int) -> List[List[Dict[str, Any]]]:
+    if isinstance(index, (BinaryIndex, IVFPQIndex)):
+        return index.query_cases(embs, int(top_k))
+    res = index.query(query_embeddings=embs.tolist(), n_results=int(top_k))
+    return [_neighbors_from_result(res, i) for i in range(len(embs))]
+
+
+# Same model similar_cases.py uses to embed the indexed cases.
+_EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+@lru_cache(maxsize=1)
+def _get_embedder() -> Any:
+    """
+    Load the query embedding model once per process; queries embed here and
+    pass query_embeddings, so Chroma's own embedding function is never used.
+    Uses the ONNX export when FRAUD_AGENT_ONNX_MODEL_DIR is set, matching the
+    vectors similar_cases indexed with it.
+    """
+    model_dir = onnx_model_dir()
+    if model_dir:
+        return OnnxEmbedder(model_dir)
+
+    from chromadb.utils import embedding_functions
+
+    return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=_EMBED_MODEL_NAME)
+
+
+@lru_cache(maxsize=1024)
+def _embed_query(query_text: str) -> np.ndarray:
+    """
+    Embed one query text, memoized by text so reruns on the same case skip
+    the forward pass. The returned array is shared and read-only.
+    """
+    emb = np.asarray(_get_embedder()([query_text])[0], dtype=np.float32)
+    emb.setflags(write=False)
+    return emb
+
+
+def _embed_queries(query_texts: List[str]) -> np.ndarray:
+    # One forward pass for the whole chunk; rows align with query_texts.
+    return np.stack(
+        [np.asarray(e, dtype=np.float32) for e in _get_embedder()(list(query_texts))]
+    )
+
+
+@lru_cache(maxsize=8)
+def _get_collection(chroma_path: str, collection_name: str) -> Any:
+    """
+    Open the Chroma client + collection once per (path, name) and reuse it.
+    Failures raise and are not cached, so a store built later is picked up.
+    No embedding_function: queries pass query_embeddings, and chromadb 1.x
+    rejects one that differs from the function persisted at build time.
+    """
+    import chromadb
+
+    client = chromadb.PersistentClient(path=chroma_path)
+    return client.get_collection(name=collection_name)
+
+
 def _retrieve_similar_cases(
     query_text: str,
     top_k: int,
     chroma_path: str,
     collection_name: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
-    if not os.path.exists(chroma_path):
+    if not _chroma_path_exists(chroma_path):
         return []
 
+    col_name = collection_name or _get_chroma_collection_name()
+
     try:
-        import chromadb
+        index = _get_index(chroma_path, col_name, _get_retrieval_backend())
     except Exception:
         return []
 
-    client = chromadb.PersistentClient(path=chroma_path)
+    emb = _embed_query(query_text)
+    return _query_index(index, emb[None, :], top_k)[0]
+
+
+def _retrieve_similar_cases_batch(
+    query_texts: List[str],
+    top_k: int,
+    chroma_path: str,
+    collection_name: Optional[str] = None,
+    chunk_size: int = 64,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Same as _retrieve_similar_cases, but embeds and queries in chunks of
+    chunk_size. Returns one neighbor list per query text, in input order.
+    """
+    empty: List[List[Dict[str, Any]]] = [[] for _ in query_texts]
+    if not query_texts or not _chroma_path_exists(chroma_path):
+        return empty
 
     col_name = collection_name or _get_chroma_collection_name()
 
     try:
-        col = client.get_collection(name=col_name)
+        index = _get_index(chroma_path, col_name, _get_retrieval_backend())
     except Exception:
-        return []
+        return empty
+
+    out: List[List[Dict[str, Any]]] = []
+    for start in range(0, len(query_texts), int(chunk_size)):
+        chunk = query_texts[start : start + int(chunk_size)]
+        out.extend(_query_index(index, _embed_queries(chunk), top_k))
+    return out
 
-    res = col.query(query_texts=[query_text], n_results=int(top_k))
 
-    docs = (res.get("documents") or [[]])[0]
-    dists = (res.get("distances") or [[]])[0]
-    metas = (res.get("metadatas") or [[]])[0]
+def _neighbors_from_result(res: Dict[str, Any], i: int) -> List[Dict[str, Any]]:
+    docs = _result_row(res, "documents", i)
+    dists = _result_row(res, "distances", i)
+    metas = _result_row(res, "metadatas", i)
 
     out: List[Dict[str, Any]] = []
-    for i in range(len(docs)):
-        meta = metas[i] if i < len(metas) else {}
+    for j in range(len(docs)):
+        meta = metas[j] if j < len(metas) else {}
         if not isinstance(meta, dict):
             meta = {}
         out.append(
             {
                 "transaction_id": meta.get("transaction_id"),
                 "label": meta.get("label"),
-                "document": docs[i],
-                "distance": dists[i] if i < len(dists) else None,
+                "document": docs[j],
+                "distance": dists[j] if j < len(dists) else None,
             }
         )
     return out
 
 
+def _result_row(res: Dict[str, Any], key: str, i: int) -> List[Any]:
+    rows = res.get(key) or []
+    return (rows[i] if i < len(rows) else None) or []
+
+
+def _label_stats(count: int, fraud: int) -> Dict[str, Any]:
+    rate = (fraud / count) if count > 0 else None
+    return {"count": count, "fraud": fraud, "rate": rate}
+
+
 def _neighbor_stats(neighbors: List[Dict[str, Any]], max_distance: float) -> Dict[str, Any]:
-    def summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
-        fraud = 0
-        count = 0
-        for r in rows:
-            lbl = r.get("label")
-            if lbl is None:
-                continue
-            try:
-                lbl_int = int(lbl)
-            except Exception:
-                continue
-            count += 1
-            fraud += 1 if lbl_int == 1 else 0
-        rate = (fraud / count) if count > 0 else None
-        return {"count": count, "fraud": fraud, "rate": rate}
-
-    all_stats = summarize(neighbors)
-
-    close_neighbors: List[Dict[str, Any]] = []
-    for r in neighbors:
-        dist = r.get("distance")
-        try:
-            dist_f = float(dist)
-        except Exception:
-            continue
-        if dist_f <= max_distance:
-            close_neighbors.append(r)
-
-    close_stats = summarize(close_neighbors)
+    n = len(neighbors)
+    # Unusable labels / distances become NaN and drop out of the masks below.
+    labels = np.fromiter(
+        (_safe_float(r.get("label"), np.nan) for r in neighbors), dtype=np.float32, count=n
+    )
+    dists = np.fromiter(
+        (_safe_float(r.get("distance"), np.nan) for r in neighbors), dtype=np.float64, count=n
+    )
+
+    valid = ~np.isnan(labels)
+    fraud = valid & (labels == 1)
+    close = dists <= float(max_distance)
+
+    all_stats = _label_stats(int(valid.sum()), int(fraud.sum()))
+    close_stats = _label_stats(int((valid & close).sum()), int((fraud & close).sum()))
 
     ui_rate = close_stats["rate"]
     if ui_rate is None:
@@ -275,64 +486,106 @@ def _decide_action(
 
     neighbor_ok = (close_rate is not None) and (int(close_count) >= 5)
 
+    close_rate_high = bool(neighbor_ok and close_rate >= 0.90)
+
+    # Integer adds, no branches: 0 (< 0.60) .. 4 (>= 0.97)
+    proba = float(proba)
+    proba_band = (proba >= 0.60) + (proba >= 0.70) + (proba >= 0.92) + (proba >= 0.97)
+
+    idx = (proba_band << 3) | (strong_rules << 2) | (neighbor_ok << 1) | close_rate_high
+    return _ACTION_TABLE[idx]
+
+
+def _policy_action(proba_band: int, strong_rules: bool, neighbor_ok: bool, close_rate_high: bool) -> str:
+    """
+    The POLICY v9 rules from _decide_action, written over the packed inputs.
+    Only used to build _ACTION_TABLE.
+    """
+    neighbor_high = neighbor_ok and close_rate_high
+
     # BLOCK
-    if proba >= 0.97:
+    if proba_band >= 4:
         return "block"
-    if neighbor_ok and proba >= 0.92 and close_rate >= 0.90:
+    if neighbor_high and proba_band >= 3:
         return "block"
 
     # REVIEW hard rail (prevents 0.73 to 0.74 from being allowed)
-    if proba >= 0.70:
+    if proba_band >= 2:
         return "review"
 
     # REVIEW neighbor override (prevents cases like proba 0.696 with close_rate 1.0 from being allowed)
-    if neighbor_ok and proba >= 0.60 and close_rate >= 0.90:
+    if neighbor_high and proba_band >= 1:
         return "review"
 
     # REVIEW mid band plus strong rules
-    if proba >= 0.60 and strong_rules:
+    if proba_band >= 1 and strong_rules:
         return "review"
 
     return "allow"
 
 
+# Neighbors only move the decision for 0.60 <= proba < 0.97: below that every
+# rule needs proba >= 0.60, at or above it the model alone blocks.
+_NEIGHBOR_PROBA_MIN = 0.60
+_NEIGHBOR_PROBA_MAX = 0.97
 
-def build_case_report(
+
+def _needs_neighbors(proba: float) -> bool:
+    return _NEIGHBOR_PROBA_MIN <= proba < _NEIGHBOR_PROBA_MAX
+
+
+# Truth table indexed by (proba_band << 3) | (strong_rules << 2) | (neighbor_ok << 1) | close_rate_high
+_ACTION_TABLE = tuple(
+    _policy_action(idx >> 3, bool(idx & 4), bool(idx & 2), bool(idx & 1)) for idx in range(5 << 3)
+)
+
+
+def build_case_report_no_ann(
     transaction_id: int,
-    top_k: int = 5,
-    max_distance: float = 0.25,
     chroma_path: Optional[str] = None,
     chroma_collection: Optional[str] = None,
+    fraud_proba: Optional[float] = None,
 ) -> Dict[str, Any]:
+    """
+    First half of build_case_report: evidence, model score, rule signals and
+    the retrieval query text. Pass the result and its neighbors to
+    finalize_with_neighbors to get the full report. fraud_proba skips the
+    per-case model call when the caller already scored the case (score_many).
+    """
     tx_id_int = int(transaction_id)
 
-    evidence = build_evidence(tx_id_int)
-
-    score_out = score_transaction(tx_id_int)
-    proba = _coerce_score_to_proba(score_out)
+    # Copy so callers can't mutate the cached entry through the report.
+    evidence = dict(_cached_evidence(tx_id_int))
+    if fraud_proba is None:
+        proba = _cached_proba(tx_id_int)
+    else:
+        proba = fraud_proba
 
     sig = _compute_signals(evidence)
-    signals_dict = {
-        "high_amount": sig.high_amount,
-        "high_velocity_10m": sig.high_velocity_10m,
-        "high_velocity_1h": sig.high_velocity_1h,
-        "identity_missing_heavy": sig.identity_missing_heavy,
-        "email_mismatch": sig.email_mismatch,
-        "signal_score": sig.signal_score,
-        "signal_reasons": sig.signal_reasons,
+
+    return {
+        "transaction_id": tx_id_int,
+        "evidence": evidence,
+        "fraud_proba": float(proba),
+        "signals": sig,
+        "query_text": _build_query_text(evidence),
+        "chroma_path": chroma_path or _get_chroma_path(),
+        "chroma_collection": chroma_collection or _get_chroma_collection_name(),
     }
 
-    query_text = _build_query_text(evidence)
 
-    chroma_path_final = chroma_path or _get_chroma_path()
-    chroma_collection_final = chroma_collection or _get_chroma_collection_name()
+def finalize_with_neighbors(
+    stub: Dict[str, Any],
+    similar_cases: List[Dict[str, Any]],
+    max_distance: float = 0.25,
+    neighbors_retrieved: bool = True,
+) -> Dict[str, Any]:
+    tx_id_int = stub["transaction_id"]
+    evidence = stub["evidence"]
+    proba = stub["fraud_proba"]
+    sig = stub["signals"]
 
-    similar_cases = _retrieve_similar_cases(
-        query_text=query_text,
-        top_k=int(top_k),
-        chroma_path=chroma_path_final,
-        collection_name=chroma_collection_final,
-    )
+    signals_dict = asdict(sig)
 
     nstats = _neighbor_stats(similar_cases, max_distance=float(max_distance))
     close_rate = nstats.get("close_rate")
@@ -373,13 +626,51 @@ def build_case_report(
             "decision_logic": "Action is based on model probability, rule signals, and close neighbor precedent.",
             "signal_reasons": signals_dict.get("signal_reasons", []),
             "precedent_summary": precedent_summary,
-            "chroma_path": chroma_path_final,
-            "chroma_collection": chroma_collection_final,
+            "neighbors_retrieved": bool(neighbors_retrieved),
+            "chroma_path": stub["chroma_path"],
+            "chroma_collection": stub["chroma_collection"],
         },
     }
     return report
 
 
+def build_case_report(
+    transaction_id: int,
+    top_k: int = 5,
+    max_distance: float = 0.25,
+    chroma_path: Optional[str] = None,
+    chroma_collection: Optional[str] = None,
+    force_retrieve: bool = False,
+) -> Dict[str, Any]:
+    """
+    Neighbor retrieval is skipped when the model probability alone decides the
+    action (see _needs_neighbors); force_retrieve=True always fetches them,
+    e.g. so analysts can inspect precedent on any case.
+    """
+    stub = build_case_report_no_ann(
+        transaction_id,
+        chroma_path=chroma_path,
+        chroma_collection=chroma_collection,
+    )
+
+    retrieve = force_retrieve or _needs_neighbors(stub["fraud_proba"])
+    similar_cases: List[Dict[str, Any]] = []
+    if retrieve:
+        similar_cases = _retrieve_similar_cases(
+            query_text=stub["query_text"],
+            top_k=int(top_k),
+            chroma_path=stub["chroma_path"],
+            collection_name=stub["chroma_collection"],
+        )
+
+    return finalize_with_neighbors(
+        stub,
+        similar_cases,
+        max_distance=float(max_distance),
+        neighbors_retrieved=retrieve,
+    )
+
+
 def main() -> None:
     import argparse
 
@@ -389,6 +680,7 @@ def main() -> None:
     parser.add_argument("--max_distance", type=float, default=0.25)
     parser.add_argument("--chroma_path", type=str, default=None)
     parser.add_argument("--chroma_collection", type=str, default=None)
+    parser.add_argument("--force_retrieve", action="store_true")
     args = parser.parse_args()
 
     report = build_case_report(
@@ -397,8 +689,9 @@ def main() -> None:
         max_distance=args.max_distance,
         chroma_path=args.chroma_path,
         chroma_collection=args.chroma_collection,
+        force_retrieve=args.force_retrieve,
     )
-    print(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2, default=_json_default))
 
 
 if __name__ == "__main__":
@@ -1,13 +1,34 @@
 import argparse
+import csv
 import os
-from typing import Dict, Any, List, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Dict, Any, List, Tuple, Optional, Union
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 
 try:
-    from .agent_orchestrator import build_case_report
+    from .agent_orchestrator import (
+        build_case_report_no_ann,
+        finalize_with_neighbors,
+        _needs_neighbors,
+        _get_chroma_collection_name,
+        _get_chroma_path,
+        _retrieve_similar_cases_batch,
+    )
+    from .scoring import load_model_artifact, score_many
 except Exception:
-    from src.agent_orchestrator import build_case_report
+    from src.agent_orchestrator import (
+        build_case_report_no_ann,
+        finalize_with_neighbors,
+        _needs_neighbors,
+        _get_chroma_collection_name,
+        _get_chroma_path,
+        _retrieve_similar_cases_batch,
+    )
+    from src.scoring import load_model_artifact, score_many
 
 
 def resolve_data_path(data_arg: Optional[str]) -> str:
@@ -41,29 +62,141 @@ def resolve_data_path(data_arg: Optional[str]) -> str:
     )
 
 
-def compute_bucket_stats(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
-    buckets = {"allow": [], "review": [], "block": []}
-    for r in rows:
-        a = str(r["action"]).lower()
-        if a not in buckets:
-            continue
-        buckets[a].append(r)
+@lru_cache(maxsize=4)
+def load_labels(data_path: str, id_col: str, label_col: str) -> pd.DataFrame:
+    """
+    Read only id_col and label_col from the CSV, typed at parse time and
+    with null rows dropped. Memoized so repeated runs in one process do not
+    re-parse the file. Callers must not mutate the returned frame.
+    """
+    with open(data_path, newline="") as f:
+        header = next(csv.reader(f), [])
+
+    if id_col not in header:
+        raise ValueError(f"id_col '{id_col}' not found in columns: {header[:30]} ...")
+    if label_col not in header:
+        raise ValueError(f"label_col '{label_col}' not found in columns: {header[:30]} ...")
+
+    table = pacsv.read_csv(
+        data_path,
+        convert_options=pacsv.ConvertOptions(
+            include_columns=[id_col, label_col],
+            column_types={id_col: pa.int64(), label_col: pa.int8()},
+        ),
+    )
+    return table.drop_null().to_pandas()
+
+
+BUCKETS = ["allow", "review", "block"]
+
+
+def compute_bucket_stats(rows: Union[List[Dict[str, Any]], pd.DataFrame]) -> Dict[str, Dict[str, Any]]:
+    rdf = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+    if rdf.empty:
+        rdf = pd.DataFrame(columns=["action", "label", "proba"])
+
+    g = (
+        pd.DataFrame(
+            {
+                "action": rdf["action"].astype(str).str.lower(),
+                "fraud": (rdf["label"].astype(int) == 1).astype(int),
+                "proba": rdf["proba"].astype(float),
+            }
+        )
+        .groupby("action")
+        .agg(count=("fraud", "size"), fraud_count=("fraud", "sum"), avg_model_proba=("proba", "mean"))
+        .reindex(BUCKETS)
+    )
 
     out: Dict[str, Dict[str, Any]] = {}
-    for b, items in buckets.items():
-        n = len(items)
-        fraud = sum(1 for x in items if int(x["label"]) == 1) if n else 0
-        rate = (fraud / n) if n else None
-        avg_proba = (sum(float(x["proba"]) for x in items) / n) if n else None
+    for b in BUCKETS:
+        n = 0 if pd.isna(g.at[b, "count"]) else int(g.at[b, "count"])
+        fraud = int(g.at[b, "fraud_count"]) if n else 0
         out[b] = {
             "count": n,
             "fraud_count": fraud,
-            "fraud_rate": rate,
-            "avg_model_proba": avg_proba,
+            "fraud_rate": (fraud / n) if n else None,
+            "avg_model_proba": float(g.at[b, "avg_model_proba"]) if n else None,
         }
     return out
 
 
+def _init_worker() -> None:
+    # Load the model once per worker process instead of on the first task.
+    load_model_artifact()
+
+
+def build_stubs(
+    pairs: List[Tuple[int, int]],
+    chroma_path: str,
+    chroma_collection: str,
+    workers: Optional[int] = None,
+    executor: str = "thread",
+    probas: Optional[Dict[int, float]] = None,
+) -> Tuple[List[Tuple[int, int, Dict[str, Any]]], List[Tuple[int, str]]]:
+    """
+    Run build_case_report_no_ann for every (tx_id, label) pair in parallel.
+    Threads suit the DuckDB/IO bound default; executor="process" spreads
+    CPU bound scoring across cores. probas holds model scores already
+    computed in bulk; ids missing from it are scored per case. Stubs come
+    back in input order.
+    """
+    probas = probas or {}
+
+    if executor == "process":
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+
+    done: List[Tuple[int, int, int, Dict[str, Any]]] = []
+    failures: List[Tuple[int, str]] = []
+
+    with pool:
+        futures = {
+            pool.submit(
+                build_case_report_no_ann,
+                tx_id,
+                chroma_path=chroma_path,
+                chroma_collection=chroma_collection,
+                fraud_proba=probas.get(tx_id),
+            ): (i, tx_id, lbl)
+            for i, (tx_id, lbl) in enumerate(pairs)
+        }
+        for fut in as_completed(futures):
+            i, tx_id, lbl = futures[fut]
+            try:
+                done.append((i, tx_id, lbl, fut.result()))
+            except Exception as e:
+                failures.append((tx_id, str(e)))
+
+    done.sort(key=lambda x: x[0])
+    return [(tx_id, lbl, stub) for _, tx_id, lbl, stub in done], failures
+
+
+def summarize_report(tx_id: int, lbl: int, report: Dict[str, Any]) -> Dict[str, Any]:
+    action = str(report.get("recommended_action", "review")).lower()
+    proba = float(report.get("fraud_proba", 0.0))
+
+    neighbor_rate = report.get("neighbor_fraud_rate_close")
+    close_count = report.get("neighbor_close_count")
+
+    sig_score = report.get("signals", {}).get("signal_score", 0)
+    identity_missing_heavy = report.get("signals", {}).get("identity_missing_heavy", False)
+    email_mismatch = report.get("signals", {}).get("email_mismatch", False)
+
+    return {
+        "tx_id": int(tx_id),
+        "label": int(lbl),
+        "action": action,
+        "proba": proba,
+        "sig_score": int(sig_score or 0),
+        "identity_missing_heavy": bool(identity_missing_heavy),
+        "email_mismatch": bool(email_mismatch),
+        "neighbor_rate": float(neighbor_rate) if neighbor_rate is not None else -1.0,
+        "close_count": int(close_count or 0),
+    }
+
+
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--data", type=str, default=None, help="Folder or CSV containing TransactionID and label")
@@ -76,66 +209,88 @@ def main() -> None:
     parser.add_argument("--max_distance", type=float, default=0.25)
     parser.add_argument("--chroma_path", type=str, default=None)
     parser.add_argument("--chroma_collection", type=str, default=None)
+    parser.add_argument("--query_batch", type=int, default=64, help="Query texts per Chroma request")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--executor", type=str, default="thread", choices=["thread", "process"])
+    parser.add_argument(
+        "--force_retrieve",
+        action="store_true",
+        help="Fetch neighbors for every case, not only where they can change the action",
+    )
 
     parser.add_argument("--debug", action="store_true")
     args = parser.parse_args()
 
     data_path = resolve_data_path(args.data)
-    df = pd.read_csv(data_path)
-
-    if args.id_col not in df.columns:
-        raise ValueError(f"id_col '{args.id_col}' not found in columns: {list(df.columns)[:30]} ...")
-    if args.label_col not in df.columns:
-        raise ValueError(f"label_col '{args.label_col}' not found in columns: {list(df.columns)[:30]} ...")
-
-    base = df[[args.id_col, args.label_col]].dropna()
-    base[args.id_col] = base[args.id_col].astype(int)
-    base[args.label_col] = base[args.label_col].astype(int)
+    base = load_labels(data_path, args.id_col, args.label_col)
 
     n = min(args.n, len(base))
-    sample = base.sample(n=n, random_state=args.seed)
+    sample = base.sample(n=n, random_state=args.seed, ignore_index=True)
 
     results: List[Dict[str, Any]] = []
     failures: List[Tuple[int, str]] = []
 
-    for tx_id, lbl in zip(sample[args.id_col].tolist(), sample[args.label_col].tolist()):
+    chroma_path = args.chroma_path or _get_chroma_path()
+    chroma_collection = args.chroma_collection or _get_chroma_collection_name()
+
+    # Scoring in bulk, then evidence per transaction in parallel; retrieval is batched below.
+    pairs = [
+        (int(tx_id), int(lbl))
+        for tx_id, lbl in sample[[args.id_col, args.label_col]].itertuples(index=False, name=None)
+    ]
+
+    # One query + one predict_proba for the whole sample; if any id is
+    # missing, build_stubs scores per case and reports the failures.
+    try:
+        probas = {r["transaction_id"]: r["fraud_proba"] for r in score_many([tx_id for tx_id, _ in pairs])}
+    except Exception:
+        probas = {}
+
+    stubs, stub_failures = build_stubs(
+        pairs,
+        chroma_path=chroma_path,
+        chroma_collection=chroma_collection,
+        workers=args.workers,
+        executor=args.executor,
+        probas=probas,
+    )
+    failures.extend(stub_failures)
+
+    retrieve = [args.force_retrieve or _needs_neighbors(stub["fraud_proba"]) for _, _, stub in stubs]
+    need = [i for i, r in enumerate(retrieve) if r]
+    neighbors: List[List[Dict[str, Any]]] = [[] for _ in stubs]
+    failed = set()
+
+    try:
+        fetched = _retrieve_similar_cases_batch(
+            [stubs[i][2]["query_text"] for i in need],
+            top_k=int(args.top_k),
+            chroma_path=chroma_path,
+            collection_name=chroma_collection,
+            chunk_size=int(args.query_batch),
+        )
+        for i, similar_cases in zip(need, fetched):
+            neighbors[i] = similar_cases
+    except Exception as e:
+        failed = set(need)
+        failures.extend((stubs[i][0], str(e)) for i in need)
+
+    for i, (tx_id, lbl, stub) in enumerate(stubs):
+        if i in failed:
+            continue
         try:
-            report = build_case_report(
-                transaction_id=int(tx_id),
-                top_k=int(args.top_k),
+            report = finalize_with_neighbors(
+                stub,
+                neighbors[i],
                 max_distance=float(args.max_distance),
-                chroma_path=args.chroma_path,
-                chroma_collection=args.chroma_collection,
+                neighbors_retrieved=retrieve[i],
             )
-
-            action = str(report.get("recommended_action", "review")).lower()
-            proba = float(report.get("fraud_proba", 0.0))
-
-            neighbor_rate = report.get("neighbor_fraud_rate_close")
-            close_count = report.get("neighbor_close_count")
-
-            sig_score = report.get("signals", {}).get("signal_score", 0)
-            identity_missing_heavy = report.get("signals", {}).get("identity_missing_heavy", False)
-            email_mismatch = report.get("signals", {}).get("email_mismatch", False)
-
-            results.append(
-                {
-                    "tx_id": int(tx_id),
-                    "label": int(lbl),
-                    "action": action,
-                    "proba": proba,
-                    "sig_score": int(sig_score or 0),
-                    "identity_missing_heavy": bool(identity_missing_heavy),
-                    "email_mismatch": bool(email_mismatch),
-                    "neighbor_rate": float(neighbor_rate) if neighbor_rate is not None else -1.0,
-                    "close_count": int(close_count or 0),
-                }
-            )
-
+            results.append(summarize_report(tx_id, lbl, report))
         except Exception as e:
-            failures.append((int(tx_id), str(e)))
+            failures.append((tx_id, str(e)))
 
-    stats = compute_bucket_stats(results)
+    rdf = pd.DataFrame(results)
+    stats = compute_bucket_stats(rdf)
 
     print("\n=== Batch Policy Evaluation ===")
     print(f"Data: {data_path}")
@@ -145,7 +300,7 @@ def main() -> None:
         f"chroma_path={args.chroma_path} | chroma_collection={args.chroma_collection}\n"
     )
 
-    for b in ["allow", "review", "block"]:
+    for b in BUCKETS:
         s = stats[b]
         rate_str = "N/A" if s["fraud_rate"] is None else f"{s['fraud_rate']:.4f}"
         proba_str = "N/A" if s["avg_model_proba"] is None else f"{s['avg_model_proba']:.4f}"
@@ -162,10 +317,8 @@ def main() -> None:
         print(f"\nOverall sample fraud rate: {overall_rate:.4f}")
 
     if args.debug and results:
-        rdf = pd.DataFrame(results)
-
         print("\n=== DEBUG: Example rows per bucket ===")
-        for bucket in ["allow", "review", "block"]:
+        for bucket in BUCKETS:
             sub = rdf[rdf["action"] == bucket].sort_values("proba", ascending=False).head(10)
             print(f"\n-- {bucket.upper()} examples (top 10 by proba) --")
             if len(sub) == 0:
@@ -1,22 +1,8 @@
 import json
-from datetime import datetime, timezone
 
-from src.scoring import score_transaction
-from src.evidence import build_evidence
-
-
-def decide_action(fraud_proba: float) -> str:
-    """
-    Simple policy thresholds (tune later):
-      - >= 0.90: block
-      - >= 0.70: review
-      - else: allow
-    """
-    if fraud_proba >= 0.90:
-        return "block"
-    if fraud_proba >= 0.70:
-        return "review"
-    return "allow"
+# The report and policy live in the orchestrator; this module only adds the
+# analyst facing bullets and narrative on top of a report.
+from src.agent_orchestrator import build_case_report, _decide_action as decide_action, _json_default
 
 
 def evidence_bullets(ev: dict) -> list:
@@ -81,27 +67,10 @@ def narrative(action: str, fraud_proba: float, ev: dict) -> str:
     return " ".join(parts)
 
 
-def build_case_report(transaction_id: int) -> dict:
-    s = score_transaction(transaction_id)
-    ev = build_evidence(transaction_id)
-
-    action = decide_action(s["fraud_proba"])
-
-    report = {
-        "case_id": f"CASE-{transaction_id}",
-        "created_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
-        "transaction_id": transaction_id,
-        "fraud_proba": s["fraud_proba"],
-        "recommended_action": action,
-        "evidence": ev,
-        "evidence_bullets": evidence_bullets(ev),
-        "investigator_narrative": narrative(action, s["fraud_proba"], ev),
-    }
-    return report
-
-
 if __name__ == "__main__":
     # Quick CLI test: change to any TransactionID you want
     test_id = 3213699
     rep = build_case_report(test_id)
-    print(json.dumps(rep, indent=2))
+    rep["evidence_bullets"] = evidence_bullets(rep["evidence"])
+    rep["investigator_narrative"] = narrative(rep["recommended_action"], rep["fraud_proba"], rep["evidence"])
+    print(json.dumps(rep, indent=2, default=_json_default))
@@ -1,4 +1,7 @@
 import os
+import threading
+from functools import lru_cache
+
 import duckdb
 import pandas as pd
 
@@ -6,8 +9,30 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(PROJECT_ROOT, "data", "ieee.duckdb")
 
 
+# One read-only connection per process, opened on first use. DuckDB
+# connections are not safe to share across threads, so each thread works on
+# its own cursor of it.
+_CON = None
+_CON_LOCK = threading.Lock()
+_LOCAL = threading.local()
+
+
+def _get_con() -> duckdb.DuckDBPyConnection:
+    global _CON
+    cur = getattr(_LOCAL, "cur", None)
+    if cur is None:
+        with _CON_LOCK:
+            if _CON is None:
+                _CON = duckdb.connect(DB_PATH, read_only=True)
+            cur = _CON.cursor()
+        _LOCAL.cur = cur
+    return cur
+
+
 def _is_missing(x) -> bool:
-    return x is None or (isinstance(x, float) and pd.isna(x)) or pd.isna(x)
+    # Plain checks instead of pd.isna: values come from fetchone(), so missing
+    # means None (or a NaN float / pd.NA from callers passing pandas values).
+    return x is None or x is pd.NA or (isinstance(x, float) and x != x)
 
 
 def _to_py_int(x):
@@ -24,8 +49,9 @@ def _to_py_str(x):
 
 
 def get_case_row(transaction_id: int) -> dict:
-    con = duckdb.connect(DB_PATH, read_only=True)
-    row = con.execute(
+    # fetchone + column names instead of .df(): a one-row DataFrame over the
+    # full joined width costs far more than the row itself.
+    result = _get_con().execute(
         """
         SELECT *
         FROM train_joined
@@ -33,28 +59,100 @@ def get_case_row(transaction_id: int) -> dict:
         LIMIT 1
         """,
         [int(transaction_id)],
-    ).df()
-    con.close()
+    )
+    row = result.fetchone()
 
-    if row.empty:
+    if row is None:
         raise ValueError(f"TransactionID {transaction_id} not found in train_joined")
 
-    return row.iloc[0].to_dict()
+    return dict(zip([d[0] for d in result.description], row))
+
+
+@lru_cache(maxsize=1)
+def _identity_columns() -> tuple:
+    # (name, type) of every identity column, read once from the train_joined
+    # schema. The single definition of "identity column" for evidence and
+    # the SQL version in similar_cases.
+    return tuple(
+        (name, ctype)
+        for _, name, ctype, *_ in _get_con().execute("PRAGMA table_info('train_joined')").fetchall()
+        if name.startswith("id_") or name in ["DeviceType", "DeviceInfo"]
+    )
+
+
+@lru_cache(maxsize=None)
+def _identity_stats(missing: int, total: int) -> dict:
+    # Only a few dozen (missing, total) pairs exist, so derive each once.
+    ratio = missing / max(total, 1)
+    return {
+        "identity_present": bool(ratio < 0.95),
+        "identity_missing_ratio": float(ratio),
+        "identity_cols_count": int(total),
+    }
 
 
 def compute_identity_presence(case: dict) -> dict:
-    identity_cols = [c for c in case.keys() if c.startswith("id_") or c in ["DeviceType", "DeviceInfo"]]
+    identity_cols = _identity_columns()
     if not identity_cols:
         return {"identity_present": None, "identity_missing_ratio": None, "identity_cols_count": 0}
 
-    missing = sum(pd.isna(case.get(c)) for c in identity_cols)
-    ratio = missing / max(len(identity_cols), 1)
-    identity_present = ratio < 0.95
+    # Null bitmask over the identity columns; popcount gives the missing count.
+    mask = 0
+    for i, (c, _) in enumerate(identity_cols):
+        v = case.get(c)
+        mask |= (v is None or (isinstance(v, float) and v != v)) << i
+
+    return dict(_identity_stats(mask.bit_count(), len(identity_cols)))
+
+
+# ingest_duckdb.py precomputes the three window counts per transaction into
+# velocity_counts, so evidence needs a single point lookup. Databases built
+# without it fall back to a range probe on train_joined.
+VELOCITY_COUNTS_TABLE = "velocity_counts"
+
+
+@lru_cache(maxsize=None)
+def _has_table(name: str) -> bool:
+    row = _get_con().execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = ?", [name]
+    ).fetchone()
+    return bool(row[0])
+
 
+# The three windows share one range probe; the 24h window bounds the scan.
+_VELOCITY_COUNTS = """
+    SELECT
+      COUNT(*) FILTER (WHERE TransactionDT >= ? - 600) AS c10m,
+      COUNT(*) FILTER (WHERE TransactionDT >= ? - 3600) AS c1h,
+      COUNT(*) AS c24h
+    FROM train_joined
+    WHERE {key}
+      AND TransactionDT BETWEEN ? - 86400 AND ?
+"""
+_FULL_KEY = "card1 = ? AND addr1 = ? AND P_emaildomain = ?"
+_CARD1_KEY = "card1 = ?"
+
+
+def _lookup_velocity_counts(con: duckdb.DuckDBPyConnection, transaction_id: int) -> dict:
+    row = con.execute(
+        f"""
+        SELECT TransactionDT, entity_key_used, c10m, c1h, c24h
+        FROM {VELOCITY_COUNTS_TABLE}
+        WHERE TransactionID = ?
+        """,
+        [int(transaction_id)],
+    ).fetchone()
+
+    if row is None:
+        row = (None, None, None, None, None)
+
+    tx_time, key_used, c10m, c1h, c24h = row
     return {
-        "identity_present": bool(identity_present),
-        "identity_missing_ratio": float(ratio),
-        "identity_cols_count": int(len(identity_cols)),
+        "entity_key_used": key_used,
+        "entity_tx_count_10m": _to_py_int(c10m),
+        "entity_tx_count_1h": _to_py_int(c1h),
+        "entity_tx_count_24h": _to_py_int(c24h),
+        "TransactionDT": _to_py_int(tx_time),
     }
 
 
@@ -64,10 +162,10 @@ def compute_velocity_features(transaction_id: int) -> dict:
       card1 + addr1 + P_emaildomain
     fallback:
       card1 only
-
-    Fix: convert numpy scalar params to Python native types before passing to DuckDB.
     """
-    con = duckdb.connect(DB_PATH, read_only=True)
+    con = _get_con()
+    if _has_table(VELOCITY_COUNTS_TABLE):
+        return _lookup_velocity_counts(con, transaction_id)
 
     row = con.execute(
         """
@@ -77,10 +175,9 @@ def compute_velocity_features(transaction_id: int) -> dict:
         LIMIT 1
         """,
         [int(transaction_id)],
-    ).df()
+    ).fetchone()
 
-    if row.empty or _is_missing(row.loc[0, "TransactionDT"]):
-        con.close()
+    if row is None or _is_missing(row[0]):
         return {
             "entity_key_used": None,
             "entity_tx_count_10m": None,
@@ -89,65 +186,40 @@ def compute_velocity_features(transaction_id: int) -> dict:
             "TransactionDT": None,
         }
 
-    tx_time = _to_py_int(row.loc[0, "TransactionDT"])
-    card1 = _to_py_int(row.loc[0, "card1"])
-    addr1 = _to_py_int(row.loc[0, "addr1"])
-    email = _to_py_str(row.loc[0, "P_emaildomain"])
+    tx_time, card1, addr1, email = row
+    tx_time = _to_py_int(tx_time)
 
-    use_full_key = (card1 is not None) and (addr1 is not None) and (email is not None)
+    # If card1 itself is missing, we cannot compute entity velocity
+    if _is_missing(card1):
+        return {
+            "entity_key_used": None,
+            "entity_tx_count_10m": None,
+            "entity_tx_count_1h": None,
+            "entity_tx_count_24h": None,
+            "TransactionDT": tx_time,
+        }
 
+    use_full_key = not _is_missing(addr1) and not _is_missing(email)
     if use_full_key:
-        counts = con.execute(
-            """
-            SELECT
-              SUM(CASE WHEN TransactionDT BETWEEN ? - 600 AND ? THEN 1 ELSE 0 END) AS c10m,
-              SUM(CASE WHEN TransactionDT BETWEEN ? - 3600 AND ? THEN 1 ELSE 0 END) AS c1h,
-              SUM(CASE WHEN TransactionDT BETWEEN ? - 86400 AND ? THEN 1 ELSE 0 END) AS c24h
-            FROM train_joined
-            WHERE card1 = ? AND addr1 = ? AND P_emaildomain = ?
-            """,
-            [tx_time, tx_time, tx_time, tx_time, tx_time, tx_time, card1, addr1, email],
-        ).fetchone()
-        key_used = "card1+addr1+P_emaildomain"
+        key, key_params = _FULL_KEY, [card1, addr1, email]
     else:
-        # If card1 itself is missing, we cannot compute entity velocity
-        if card1 is None:
-            con.close()
-            return {
-                "entity_key_used": None,
-                "entity_tx_count_10m": None,
-                "entity_tx_count_1h": None,
-                "entity_tx_count_24h": None,
-                "TransactionDT": tx_time,
-            }
-
-        counts = con.execute(
-            """
-            SELECT
-              SUM(CASE WHEN TransactionDT BETWEEN ? - 600 AND ? THEN 1 ELSE 0 END) AS c10m,
-              SUM(CASE WHEN TransactionDT BETWEEN ? - 3600 AND ? THEN 1 ELSE 0 END) AS c1h,
-              SUM(CASE WHEN TransactionDT BETWEEN ? - 86400 AND ? THEN 1 ELSE 0 END) AS c24h
-            FROM train_joined
-            WHERE card1 = ?
-            """,
-            [tx_time, tx_time, tx_time, tx_time, tx_time, tx_time, card1],
-        ).fetchone()
-        key_used = "card1_only"
-
-    con.close()
+        key, key_params = _CARD1_KEY, [card1]
+
+    sql = _VELOCITY_COUNTS.format(key=key)
+    c10m, c1h, c24h = con.execute(sql, [tx_time, tx_time, *key_params, tx_time, tx_time]).fetchone()
 
     return {
-        "entity_key_used": key_used,
-        "entity_tx_count_10m": int(counts[0]),
-        "entity_tx_count_1h": int(counts[1]),
-        "entity_tx_count_24h": int(counts[2]),
+        "entity_key_used": "card1+addr1+P_emaildomain" if use_full_key else "card1_only",
+        "entity_tx_count_10m": int(c10m),
+        "entity_tx_count_1h": int(c1h),
+        "entity_tx_count_24h": int(c24h),
         "TransactionDT": tx_time,
     }
 
 
 def compute_amount_features(case: dict) -> dict:
     amt = case.get("TransactionAmt", None)
-    if amt is None or pd.isna(amt):
+    if _is_missing(amt):
         return {"amount": None, "amount_high": None}
 
     amt = float(amt)
@@ -11,6 +11,52 @@ TRAIN_ID = os.path.join(RAW_DIR, "train_identity.csv")
 
 os.makedirs(PARQUET_DIR, exist_ok=True)
 
+
+# Explicit IEEE-CIS schemas (column order as in the CSV headers), so
+# read_csv skips type sniffing. M* and id_35..id_38 hold T/F flags.
+def _transaction_columns() -> dict:
+    cols = {
+        "TransactionID": "BIGINT",
+        "isFraud": "BIGINT",
+        "TransactionDT": "BIGINT",
+        "TransactionAmt": "DOUBLE",
+        "ProductCD": "VARCHAR",
+        "card1": "BIGINT",
+        "card2": "DOUBLE",
+        "card3": "DOUBLE",
+        "card4": "VARCHAR",
+        "card5": "DOUBLE",
+        "card6": "VARCHAR",
+        "addr1": "DOUBLE",
+        "addr2": "DOUBLE",
+        "dist1": "DOUBLE",
+        "dist2": "DOUBLE",
+        "P_emaildomain": "VARCHAR",
+        "R_emaildomain": "VARCHAR",
+    }
+    cols.update({f"C{i}": "DOUBLE" for i in range(1, 15)})
+    cols.update({f"D{i}": "DOUBLE" for i in range(1, 16)})
+    cols.update({f"M{i}": "VARCHAR" if i == 4 else "BOOLEAN" for i in range(1, 10)})
+    cols.update({f"V{i}": "DOUBLE" for i in range(1, 340)})
+    return cols
+
+
+def _identity_columns() -> dict:
+    string_ids = {12, 15, 16, 23, 27, 28, 29, 30, 31, 33, 34}
+    bool_ids = {35, 36, 37, 38}
+    cols = {"TransactionID": "BIGINT"}
+    for i in range(1, 39):
+        cols[f"id_{i:02d}"] = "VARCHAR" if i in string_ids else "BOOLEAN" if i in bool_ids else "DOUBLE"
+    cols["DeviceType"] = "VARCHAR"
+    cols["DeviceInfo"] = "VARCHAR"
+    return cols
+
+
+def _read_csv_sql(path: str, columns: dict) -> str:
+    struct = ", ".join(f"'{name}': '{ctype}'" for name, ctype in columns.items())
+    return f"read_csv('{path}', header = true, auto_detect = false, columns = {{{struct}}})"
+
+
 if not os.path.exists(TRAIN_TXN):
     raise FileNotFoundError(f"Missing file: {TRAIN_TXN}")
 if not os.path.exists(TRAIN_ID):
@@ -22,48 +68,94 @@ con.execute("PRAGMA threads=8;")
 con.execute("DROP TABLE IF EXISTS train_transaction;")
 con.execute("DROP TABLE IF EXISTS train_identity;")
 con.execute("DROP TABLE IF EXISTS train_joined;")
+con.execute("DROP TABLE IF EXISTS velocity_counts;")
+
+out_parquet = os.path.join(PARQUET_DIR, "train_joined.parquet")
 
-print("Loading train_transaction.csv into DuckDB...")
+print("Joining train_transaction.csv + train_identity.csv straight to Parquet...")
+# One pipeline: both CSVs stream through the LEFT JOIN into the Parquet
+# export, with no intermediate DuckDB tables. Column names and order match
+# the old joined table, including identity's TransactionID as
+# TransactionID_1 (a model feature).
 con.execute(
     f"""
-    CREATE TABLE train_transaction AS
-    SELECT *
-    FROM read_csv_auto('{TRAIN_TXN}');
+    COPY (
+        SELECT
+            t.*,
+            i.TransactionID AS TransactionID_1,
+            i.* EXCLUDE (TransactionID)
+        FROM {_read_csv_sql(TRAIN_TXN, _transaction_columns())} t
+        LEFT JOIN {_read_csv_sql(TRAIN_ID, _identity_columns())} i
+        USING (TransactionID)
+    )
+    TO '{out_parquet}'
+    (FORMAT PARQUET, CODEC 'zstd', COMPRESSION_LEVEL 3, ROW_GROUP_SIZE 122880);
     """
 )
 
-print("Loading train_identity.csv into DuckDB...")
+print("Loading train_joined from Parquet...")
+# Materialized rather than a view. Over the Parquet file, a SELECT * point
+# lookup decodes a whole row group across every column (~20x slower). Over
+# separate transaction / identity tables, batched scoring lookups pay for the
+# join (~2x slower), while the mostly-NULL identity columns only add ~5% to
+# the joined table on disk. Storage is columnar, so lookups that project a
+# few columns already read only those; a narrow copy would not help.
 con.execute(
     f"""
-    CREATE TABLE train_identity AS
+    CREATE TABLE train_joined AS
     SELECT *
-    FROM read_csv_auto('{TRAIN_ID}');
+    FROM read_parquet('{out_parquet}');
     """
 )
 
-print("Joining tables on TransactionID (LEFT JOIN)...")
+print("Precomputing entity velocity counts...")
+# Same semantics as evidence.compute_velocity_features: the full
+# card1 + addr1 + P_emaildomain key when all three are present, card1 only
+# otherwise, no counts without card1. RANGE frames include every earlier
+# transaction within the window plus ties on TransactionDT.
 con.execute(
     """
-    CREATE TABLE train_joined AS
+    CREATE TABLE velocity_counts AS
     SELECT
-        t.*,
-        i.*
-    FROM train_transaction t
-    LEFT JOIN train_identity i
-    USING (TransactionID);
-    """
-)
-
-out_parquet = os.path.join(PARQUET_DIR, "train_joined.parquet")
-
-print("Exporting joined table to Parquet (fast format for training)...")
-con.execute(
-    f"""
-    COPY (SELECT * FROM train_joined)
-    TO '{out_parquet}'
-    (FORMAT PARQUET);
+        TransactionID,
+        TransactionDT,
+        CASE
+            WHEN TransactionDT IS NULL OR card1 IS NULL THEN NULL
+            WHEN addr1 IS NOT NULL AND P_emaildomain IS NOT NULL THEN 'card1+addr1+P_emaildomain'
+            ELSE 'card1_only'
+        END AS entity_key_used,
+        CASE
+            WHEN TransactionDT IS NULL OR card1 IS NULL THEN NULL
+            WHEN addr1 IS NOT NULL AND P_emaildomain IS NOT NULL THEN COUNT(*) OVER full_10m
+            ELSE COUNT(*) OVER card_10m
+        END AS c10m,
+        CASE
+            WHEN TransactionDT IS NULL OR card1 IS NULL THEN NULL
+            WHEN addr1 IS NOT NULL AND P_emaildomain IS NOT NULL THEN COUNT(*) OVER full_1h
+            ELSE COUNT(*) OVER card_1h
+        END AS c1h,
+        CASE
+            WHEN TransactionDT IS NULL OR card1 IS NULL THEN NULL
+            WHEN addr1 IS NOT NULL AND P_emaildomain IS NOT NULL THEN COUNT(*) OVER full_24h
+            ELSE COUNT(*) OVER card_24h
+        END AS c24h
+    FROM train_joined
+    WINDOW
+        full_10m AS (PARTITION BY card1, addr1, P_emaildomain ORDER BY TransactionDT
+                     RANGE BETWEEN 600 PRECEDING AND CURRENT ROW),
+        full_1h AS (PARTITION BY card1, addr1, P_emaildomain ORDER BY TransactionDT
+                    RANGE BETWEEN 3600 PRECEDING AND CURRENT ROW),
+        full_24h AS (PARTITION BY card1, addr1, P_emaildomain ORDER BY TransactionDT
+                     RANGE BETWEEN 86400 PRECEDING AND CURRENT ROW),
+        card_10m AS (PARTITION BY card1 ORDER BY TransactionDT
+                     RANGE BETWEEN 600 PRECEDING AND CURRENT ROW),
+        card_1h AS (PARTITION BY card1 ORDER BY TransactionDT
+                    RANGE BETWEEN 3600 PRECEDING AND CURRENT ROW),
+        card_24h AS (PARTITION BY card1 ORDER BY TransactionDT
+                     RANGE BETWEEN 86400 PRECEDING AND CURRENT ROW);
     """
 )
+con.execute("CREATE UNIQUE INDEX velocity_counts_id ON velocity_counts (TransactionID);")
 
 rows = con.execute("SELECT COUNT(*) FROM train_joined;").fetchone()[0]
 print("Saved:", out_parquet)
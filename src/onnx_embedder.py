@@ -0,0 +1,68 @@
+import os
+from typing import List, Optional
+
+import numpy as np
+
+# Directory with an int8 ONNX export of all-MiniLM-L6-v2 (see README). When
+# set, indexing and query embedding both use it instead of PyTorch, so stored
+# and query vectors come from the same model.
+ONNX_MODEL_DIR_ENV = "FRAUD_AGENT_ONNX_MODEL_DIR"
+
+BASE_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# all-MiniLM-L6-v2's sentence-transformers max_seq_length
+_MAX_SEQ_LENGTH = 256
+
+
+def onnx_model_dir() -> Optional[str]:
+    return os.environ.get(ONNX_MODEL_DIR_ENV) or None
+
+
+class OnnxEmbedder:
+    """
+    MiniLM sentence embeddings on ONNX Runtime: tokenize, run the encoder,
+    mean-pool over the attention mask and L2-normalize, which is what the
+    sentence-transformers pipeline does. Prefers model_quantized.onnx (the
+    optimum-cli quantize output) when the directory has it. Needs the
+    optional optimum[onnxruntime] package.
+    """
+
+    def __init__(self, model_dir: str):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        file_name = "model_quantized.onnx"
+        if not os.path.exists(os.path.join(model_dir, file_name)):
+            file_name = "model.onnx"
+        self.model = ORTModelForFeatureExtraction.from_pretrained(model_dir, file_name=file_name)
+
+        try:
+            self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        except OSError:
+            # quantize output dirs do not always carry the tokenizer files
+            self.tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL_NAME)
+
+    def encode(self, texts: List[str], batch_size: int = 256) -> np.ndarray:
+        out = []
+        for i in range(0, len(texts), batch_size):
+            tok = self.tokenizer(
+                list(texts[i : i + batch_size]),
+                padding=True,
+                truncation=True,
+                max_length=_MAX_SEQ_LENGTH,
+                return_tensors="np",
+            )
+            hidden = np.asarray(self.model(**tok).last_hidden_state, dtype=np.float32)
+            mask = tok["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            out.append(pooled / np.clip(norms, 1e-12, None))
+
+        if not out:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack(out).astype(np.float32, copy=False)
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        # Chroma embedding-function shape, so it can stand in for
+        # SentenceTransformerEmbeddingFunction in agent_orchestrator.
+        return list(self.encode(list(input)))
@@ -1,47 +1,62 @@
+_HIGH_AMOUNT = 500
+_HIGH_VELOCITY_10M = 5
+_HIGH_VELOCITY_1H = 10
+_IDENTITY_MISSING_HEAVY = 0.95
+
+_REASON_HIGH_AMOUNT = "High transaction amount (>= 500)."
+_REASON_HIGH_VELOCITY_10M = "High entity velocity in 10 minutes (>= 5)."
+_REASON_HIGH_VELOCITY_1H = "High entity velocity in 1 hour (>= 10)."
+_REASON_IDENTITY_MISSING = "Identity signals mostly missing (>= 95%)."
+_REASON_EMAIL_MISMATCH = "Purchaser email domain differs from recipient email domain."
+
+
 def compute_risk_signals(evidence: dict) -> dict:
     """
     Human-readable risk signals derived from evidence.
     These are simple and explainable. We will make them richer later.
     """
-    signals = {
-        "high_amount": False,
-        "high_velocity_10m": False,
-        "high_velocity_1h": False,
-        "identity_missing_heavy": False,
-        "email_mismatch": False,
-        "signal_score": 0,
-        "signal_reasons": [],
-    }
+    get = evidence.get
+    reasons = []
+    score = 0
+
+    amt = get("amount")
+    high_amount = amt is not None and amt >= _HIGH_AMOUNT
+    if high_amount:
+        score += 1
+        reasons.append(_REASON_HIGH_AMOUNT)
 
-    amt = evidence.get("amount")
-    if amt is not None and amt >= 500:
-        signals["high_amount"] = True
-        signals["signal_score"] += 1
-        signals["signal_reasons"].append("High transaction amount (>= 500).")
-
-    v10 = evidence.get("entity_tx_count_10m")
-    if v10 is not None and v10 >= 5:
-        signals["high_velocity_10m"] = True
-        signals["signal_score"] += 2
-        signals["signal_reasons"].append("High entity velocity in 10 minutes (>= 5).")
-
-    v1h = evidence.get("entity_tx_count_1h")
-    if v1h is not None and v1h >= 10:
-        signals["high_velocity_1h"] = True
-        signals["signal_score"] += 2
-        signals["signal_reasons"].append("High entity velocity in 1 hour (>= 10).")
-
-    miss_ratio = evidence.get("identity_missing_ratio")
-    if miss_ratio is not None and miss_ratio >= 0.95:
-        signals["identity_missing_heavy"] = True
-        signals["signal_score"] += 1
-        signals["signal_reasons"].append("Identity signals mostly missing (>= 95%).")
-
-    p_email = evidence.get("P_emaildomain")
-    r_email = evidence.get("R_emaildomain")
-    if p_email is not None and r_email is not None and str(p_email) != str(r_email):
-        signals["email_mismatch"] = True
-        signals["signal_score"] += 1
-        signals["signal_reasons"].append("Purchaser email domain differs from recipient email domain.")
-
-    return signals
+    v10 = get("entity_tx_count_10m")
+    high_velocity_10m = v10 is not None and v10 >= _HIGH_VELOCITY_10M
+    if high_velocity_10m:
+        score += 2
+        reasons.append(_REASON_HIGH_VELOCITY_10M)
+
+    v1h = get("entity_tx_count_1h")
+    high_velocity_1h = v1h is not None and v1h >= _HIGH_VELOCITY_1H
+    if high_velocity_1h:
+        score += 2
+        reasons.append(_REASON_HIGH_VELOCITY_1H)
+
+    miss_ratio = get("identity_missing_ratio")
+    identity_missing_heavy = miss_ratio is not None and miss_ratio >= _IDENTITY_MISSING_HEAVY
+    if identity_missing_heavy:
+        score += 1
+        reasons.append(_REASON_IDENTITY_MISSING)
+
+    # Email domains come from DuckDB as str or None, so compare directly
+    p_email = get("P_emaildomain")
+    r_email = get("R_emaildomain")
+    email_mismatch = p_email is not None and r_email is not None and p_email != r_email
+    if email_mismatch:
+        score += 1
+        reasons.append(_REASON_EMAIL_MISMATCH)
+
+    return {
+        "high_amount": bool(high_amount),
+        "high_velocity_10m": bool(high_velocity_10m),
+        "high_velocity_1h": bool(high_velocity_1h),
+        "identity_missing_heavy": bool(identity_missing_heavy),
+        "email_mismatch": bool(email_mismatch),
+        "signal_score": score,
+        "signal_reasons": reasons,
+    }
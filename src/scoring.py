@@ -1,83 +1,123 @@
 import os
+from functools import lru_cache
+from typing import List
+
 import joblib
-import duckdb
 import pandas as pd
+import pyarrow as pa
+
+# Shared read-only DuckDB connection (per-thread cursors)
+try:
+    from .evidence import _get_con
+except Exception:
+    from src.evidence import _get_con
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DB_PATH = os.path.join(PROJECT_ROOT, "data", "ieee.duckdb")
 MODEL_PATH = os.path.join(PROJECT_ROOT, "models", "lgbm_baseline.joblib")
 
 
-def _encode_like_training(X: pd.DataFrame) -> pd.DataFrame:
+# Nullable Arrow booleans come back as object columns by default; keep them
+# boolean so _encode_like_training maps them to Int8 like the training frame.
+_ARROW_TYPES = {pa.bool_(): pd.BooleanDtype()}
+
+
+def _encode_like_training(
+    X: pd.DataFrame,
+    cat_maps: dict = None,
+    native_categorical: bool = False,
+) -> pd.DataFrame:
     """
     Match the baseline training preprocessing:
-      - object -> category codes
+      - object -> categoricals with the training categories (native_categorical
+        artifacts), else category codes (training categories from cat_maps
+        when given)
       - boolean -> Int8 with -1
-      - fillna(-1)
+      - fillna(-1) on non-categorical columns
     """
-    # Boolean handling (nullable boolean or bool)
-    bool_cols = [c for c in X.columns if str(X[c].dtype) == "boolean" or X[c].dtype == bool]
-    for c in bool_cols:
-        X[c] = X[c].astype("Int8").fillna(-1)
-
-    # Object to category codes
-    obj_cols = [c for c in X.columns if X[c].dtype == "object"]
-    for c in obj_cols:
-        X[c] = X[c].astype("category").cat.codes
+    cat_maps = cat_maps or {}
 
-    X = X.fillna(-1)
+    # Boolean handling (nullable boolean or bool)
+    bool_cols = X.select_dtypes(include=["bool", "boolean"]).columns
+    if len(bool_cols):
+        X[bool_cols] = X[bool_cols].astype("Int8").fillna(-1)
+
+    # Columns with saved training categories: unseen values and missing -> -1
+    # (or NaN for native categoricals, which LightGBM handles itself)
+    for c in cat_maps:
+        if c in X.columns:
+            cat = pd.Categorical(X[c], categories=cat_maps[c])
+            X[c] = cat if native_categorical else cat.codes
+
+    # Object (or pandas string) to category codes; only artifacts saved
+    # without cat_maps still get here
+    obj_cols = X.select_dtypes(include=["object", "string"]).columns
+    if len(obj_cols):
+        X[obj_cols] = X[obj_cols].apply(lambda s: s.astype("category").cat.codes)
+
+    num_cols = X.columns.difference(X.select_dtypes(include="category").columns, sort=False)
+    X[num_cols] = X[num_cols].fillna(-1)
     return X
 
 
+@lru_cache(maxsize=1)
 def load_model_artifact():
     if not os.path.exists(MODEL_PATH):
         raise FileNotFoundError(f"Model artifact not found at: {MODEL_PATH}")
     return joblib.load(MODEL_PATH)
 
 
-def fetch_transaction_row(transaction_id: int) -> pd.DataFrame:
+def fetch_transaction_rows(transaction_ids: List[int]) -> pa.Table:
     """
-    Pull the joined row for one TransactionID from DuckDB.
-    Returns a single-row dataframe.
+    Pull the joined rows for many TransactionIDs in one query.
+    Row order follows the table, not transaction_ids.
     """
-    con = duckdb.connect(DB_PATH, read_only=True)
-    df = con.execute(
+    # .arrow() is a Table on older DuckDB and a RecordBatchReader on newer;
+    # pa.table() accepts either.
+    return pa.table(_get_con().execute(
         """
         SELECT *
         FROM train_joined
-        WHERE TransactionID = ?
-        LIMIT 1
+        WHERE TransactionID IN (SELECT UNNEST(?::BIGINT[]))
         """,
-        [int(transaction_id)],
-    ).df()
-    con.close()
+        [[int(x) for x in transaction_ids]],
+    ).arrow())
 
-    if df.empty:
+
+def fetch_transaction_row(transaction_id: int) -> pd.DataFrame:
+    """
+    Pull the joined row for one TransactionID from DuckDB.
+    Returns a single-row dataframe; same query as fetch_transaction_rows.
+    """
+    tbl = fetch_transaction_rows([transaction_id])
+
+    if tbl.num_rows == 0:
         raise ValueError(f"TransactionID {transaction_id} not found in train_joined")
 
-    return df
+    return tbl.slice(0, 1).to_pandas()
 
 
-def score_transaction(transaction_id: int) -> dict:
+def score_many(transaction_ids: List[int]) -> List[dict]:
     """
-    Returns:
-      - fraud_proba
-      - model_features_used
+    Score a batch with one DuckDB query, one encode and one predict_proba call.
+    Returns one score_transaction style dict per id, in input order.
     """
     artifact = load_model_artifact()
     model = artifact["model"]
     cols = artifact["columns"]
 
-    df = fetch_transaction_row(transaction_id)
+    ids = [int(x) for x in transaction_ids]
+    if not ids:
+        return []
 
-    # Drop target + id if present
-    drop_cols = []
-    if "isFraud" in df.columns:
-        drop_cols.append("isFraud")
-    if "TransactionID" in df.columns:
-        drop_cols.append("TransactionID")
+    tbl = fetch_transaction_rows(ids)
+    found = tbl.column("TransactionID").to_pylist()
+    missing = sorted(set(ids) - set(found))
+    if missing:
+        raise ValueError(f"TransactionID {', '.join(map(str, missing[:10]))} not found in train_joined")
 
-    X = df.drop(columns=drop_cols)
+    X = tbl.select([c for c in cols if c in tbl.column_names]).to_pandas(
+        types_mapper=_ARROW_TYPES.get
+    )
 
     # Ensure same column order as training
     # If any columns are missing, add them as NaN
@@ -86,12 +126,29 @@ def score_transaction(transaction_id: int) -> dict:
             X[c] = pd.NA
     X = X[cols]
 
-    X = _encode_like_training(X)
+    X = _encode_like_training(
+        X,
+        artifact.get("cat_maps"),
+        native_categorical=bool(artifact.get("native_categorical")),
+    )
+
+    proba = model.predict_proba(X)[:, 1]
+    by_id = dict(zip(found, proba.tolist()))
+
+    return [
+        {
+            "transaction_id": tid,
+            "fraud_proba": float(by_id[tid]),
+            "model_features_used": len(cols),
+        }
+        for tid in ids
+    ]
 
-    proba = float(model.predict_proba(X)[:, 1][0])
 
-    return {
-        "transaction_id": int(transaction_id),
-        "fraud_proba": proba,
-        "model_features_used": len(cols),
-    }
+def score_transaction(transaction_id: int) -> dict:
+    """
+    Returns:
+      - fraud_proba
+      - model_features_used
+    """
+    return score_many([transaction_id])[0]
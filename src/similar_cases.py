@@ -1,11 +1,16 @@
 import os
 import json
 import argparse
+from functools import lru_cache
 import duckdb
 import chromadb
+import numpy as np
+import pyarrow as pa
 from sentence_transformers import SentenceTransformer
 
-from src.evidence import build_evidence
+from src.evidence import _get_con, _has_table, _identity_columns, build_evidence
+from src.onnx_embedder import OnnxEmbedder, onnx_model_dir
+from src.vector_index import IVFPQIndex, cases_path, ivfpq_path, load_cases, save_cases
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(PROJECT_ROOT, "data", "ieee.duckdb")
@@ -16,10 +21,57 @@ CHROMA_DIR = os.path.join(os.environ.get("LOCALAPPDATA", "C:\\Temp"), "fraud_ai_
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 COLLECTION_NAME = "fraud_cases"
 
-
-def case_text(transaction_id: int, label: int) -> str:
-    ev = build_evidence(transaction_id)
-
+# Loaded on first use and kept for the life of the process: the model takes
+# seconds to load, and the client/collection handles are safe to reuse.
+_EMBEDDER = None
+_CLIENT = None
+_COL = None
+
+
+def _get_embedder():
+    global _EMBEDDER
+    if _EMBEDDER is None:
+        model_dir = onnx_model_dir()
+        if model_dir:
+            _EMBEDDER = OnnxEmbedder(model_dir)
+        else:
+            _EMBEDDER = SentenceTransformer(MODEL_NAME)
+            # fp16 halves memory traffic on GPU; CPU stays fp32
+            if str(_EMBEDDER.device).startswith("cuda"):
+                _EMBEDDER.half()
+    return _EMBEDDER
+
+
+def _encode(texts) -> np.ndarray:
+    # float32 ndarray (unit norm, as the model already emits); converted to
+    # lists only at the Chroma boundary.
+    embedder = _get_embedder()
+    if isinstance(embedder, OnnxEmbedder):
+        return embedder.encode(list(texts), batch_size=256)
+    return embedder.encode(
+        texts,
+        batch_size=256,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    ).astype(np.float32, copy=False)
+
+
+def _get_client():
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = chromadb.PersistentClient(path=CHROMA_DIR)
+    return _CLIENT
+
+
+def _get_collection():
+    global _COL
+    if _COL is None:
+        _COL = _get_client().get_or_create_collection(name=COLLECTION_NAME)
+    return _COL
+
+
+def _format_case_text(transaction_id: int, label: int, ev: dict) -> str:
     parts = [
         f"TransactionID={transaction_id}",
         f"label={label}",
@@ -39,60 +91,151 @@ def case_text(transaction_id: int, label: int) -> str:
     return " | ".join([p for p in parts if p is not None])
 
 
+def case_text(transaction_id: int, label: int) -> str:
+    return _format_case_text(transaction_id, label, build_evidence(transaction_id))
+
+
+def _identity_missing_ratio_sql() -> str:
+    # Same columns and missing rule as evidence.compute_identity_presence
+    cols = _identity_columns()
+    if not cols:
+        return "NULL"
+    flags = [
+        f"(t.\"{name}\" IS NULL OR isnan(t.\"{name}\"))" if ctype in ("DOUBLE", "FLOAT") else f"t.\"{name}\" IS NULL"
+        for name, ctype in cols
+    ]
+    return "CAST(" + " + ".join(f"CAST({f} AS INTEGER)" for f in flags) + f" AS DOUBLE) / {len(cols)}"
+
+
+@lru_cache(maxsize=1)
+def _case_fields_sql() -> str:
+    # Only the evidence fields case/query text use, velocity from
+    # velocity_counts and the identity missing ratio computed in SQL.
+    return f"""
+        SELECT
+          t.TransactionID,
+          t.TransactionAmt AS amount,
+          t.ProductCD,
+          t.card1,
+          t.addr1,
+          t.P_emaildomain,
+          t.R_emaildomain,
+          t.DeviceType,
+          v.entity_key_used,
+          v.c10m AS entity_tx_count_10m,
+          v.c1h AS entity_tx_count_1h,
+          v.c24h AS entity_tx_count_24h,
+          {_identity_missing_ratio_sql()} AS identity_missing_ratio
+        FROM train_joined t
+        LEFT JOIN velocity_counts v USING (TransactionID)
+        WHERE t.TransactionID IN (SELECT UNNEST(?::BIGINT[]))
+    """
+
+
+def fetch_query_fields(transaction_id: int):
+    """
+    The evidence fields retrieve_similar's query text needs, in one query on
+    the shared connection. None on databases built without velocity_counts.
+    """
+    if not _has_table("velocity_counts"):
+        return None
+
+    rows = pa.table(_get_con().execute(_case_fields_sql(), [[int(transaction_id)]]).arrow()).to_pylist()
+    if not rows:
+        raise ValueError(f"TransactionID {transaction_id} not found in train_joined")
+    return rows[0]
+
+
+def case_texts(rows) -> list:
+    """
+    case_text for many (TransactionID, label) rows with one DuckDB query.
+    Falls back to case_text per row on databases built without
+    velocity_counts.
+    """
+    rows = [(int(tid), int(label)) for tid, label in rows]
+    if not rows:
+        return []
+
+    if not _has_table("velocity_counts"):
+        return [case_text(tid, label) for tid, label in rows]
+
+    fields = pa.table(_get_con().execute(_case_fields_sql(), [[tid for tid, _ in rows]]).arrow()).to_pylist()
+
+    by_id = {f["TransactionID"]: f for f in fields}
+    return [_format_case_text(tid, label, by_id[tid]) for tid, label in rows]
+
+
 def get_ids_for_indexing(limit_fraud: int, limit_nonfraud: int):
     """
-    NOTE: LIMIT pulls the first rows DuckDB returns (not random).
-    For a demo this is fine. If you want random sampling later, we can add it.
+    Reservoir sample of each class (REPEATABLE, so rebuilds index the same
+    cases). The filter sits in a subquery because USING SAMPLE applies to
+    the FROM clause before WHERE.
     """
     con = duckdb.connect(DB_PATH, read_only=True)
 
     fraud = con.execute(
-        f"SELECT TransactionID, isFraud FROM train_joined WHERE isFraud=1 LIMIT {int(limit_fraud)}"
+        f"""
+        SELECT TransactionID, isFraud
+        FROM (SELECT TransactionID, isFraud FROM train_joined WHERE isFraud=1)
+        USING SAMPLE reservoir({int(limit_fraud)} ROWS) REPEATABLE (42)
+        """
     ).fetchall()
 
     nonfraud = con.execute(
-        f"SELECT TransactionID, isFraud FROM train_joined WHERE isFraud=0 LIMIT {int(limit_nonfraud)}"
+        f"""
+        SELECT TransactionID, isFraud
+        FROM (SELECT TransactionID, isFraud FROM train_joined WHERE isFraud=0)
+        USING SAMPLE reservoir({int(limit_nonfraud)} ROWS) REPEATABLE (42)
+        """
     ).fetchall()
 
     con.close()
     return fraud + nonfraud
 
 
-def build_vector_store(limit_fraud: int, limit_nonfraud: int, batch_size: int = 128, rebuild: bool = True):
+def _remove_stale(path: str) -> None:
+    # An index from an earlier build would address rows of the old cases file
+    if os.path.exists(path):
+        os.remove(path)
+        print(f"Removed stale index: {path}")
+
+
+def build_vector_store(limit_fraud: int, limit_nonfraud: int, batch_size: int = 256, rebuild: bool = True):
     os.makedirs(CHROMA_DIR, exist_ok=True)
 
-    client = chromadb.PersistentClient(path=CHROMA_DIR)
+    global _COL
+
+    client = _get_client()
 
     if rebuild:
         try:
             client.delete_collection(COLLECTION_NAME)
         except Exception:
             pass
+        _COL = None
 
-    col = client.get_or_create_collection(name=COLLECTION_NAME)
-
-    embedder = SentenceTransformer(MODEL_NAME)
+    col = _get_collection()
 
     rows = get_ids_for_indexing(limit_fraud, limit_nonfraud)
 
     ids_batch, docs_batch, meta_batch = [], [], []
     total_added = 0
 
-    for (tid, label) in rows:
+    # Document text for every case up front, in one query
+    texts = case_texts(rows)
+
+    for (tid, label), txt in zip(rows, texts):
         tid_int = int(tid)
         label_int = int(label)
 
-        txt = case_text(tid_int, label_int)
-
         ids_batch.append(str(tid_int))
         docs_batch.append(txt)
         meta_batch.append({"transaction_id": tid_int, "label": label_int})
 
         if len(ids_batch) >= batch_size:
-            embeddings = embedder.encode(docs_batch, show_progress_bar=False).tolist()
-            col.add(ids=ids_batch, documents=docs_batch, metadatas=meta_batch, embeddings=embeddings)
+            embeddings = _encode(docs_batch)
+            col.add(ids=ids_batch, documents=docs_batch, metadatas=meta_batch, embeddings=embeddings.tolist())
             total_added += len(ids_batch)
-
             ids_batch, docs_batch, meta_batch = [], [], []
 
             if total_added % (batch_size * 10) == 0:
@@ -100,20 +243,46 @@ def build_vector_store(limit_fraud: int, limit_nonfraud: int, batch_size: int =
 
     # flush remainder
     if ids_batch:
-        embeddings = embedder.encode(docs_batch, show_progress_bar=False).tolist()
-        col.add(ids=ids_batch, documents=docs_batch, metadatas=meta_batch, embeddings=embeddings)
+        embeddings = _encode(docs_batch)
+        col.add(ids=ids_batch, documents=docs_batch, metadatas=meta_batch, embeddings=embeddings.tolist())
         total_added += len(ids_batch)
 
     print(f"Built vector store with {total_added} cases at: {CHROMA_DIR}")
 
+    # The cases file (see vector_index.py) mirrors the whole collection, not
+    # just this run's rows: without rebuild the collection keeps earlier cases.
+    stored = col.get(include=["embeddings", "documents", "metadatas"])
+    if stored["ids"]:
+        out_cases = cases_path(CHROMA_DIR, COLLECTION_NAME)
+        save_cases(
+            out_cases,
+            [m["transaction_id"] for m in stored["metadatas"]],
+            [m["label"] for m in stored["metadatas"]],
+            stored["documents"],
+            np.asarray(stored["embeddings"], dtype=np.float32),
+        )
+        print(f"Saved cases file for compact indexes: {out_cases}")
+
+        out_ivf = ivfpq_path(CHROMA_DIR, COLLECTION_NAME)
+        try:
+            ivf = IVFPQIndex.build(load_cases(out_cases))
+        except ImportError:
+            print("faiss not installed; skipping IVF-PQ index.")
+            _remove_stale(out_ivf)
+        except ValueError as e:
+            print(f"Skipping IVF-PQ index: {e}")
+            _remove_stale(out_ivf)
+        else:
+            ivf.save(out_ivf)
+            print(f"Saved IVF-PQ index: {out_ivf}")
+
 
 def retrieve_similar(transaction_id: int, top_k: int = 5):
-    client = chromadb.PersistentClient(path=CHROMA_DIR)
-    col = client.get_or_create_collection(name=COLLECTION_NAME)
-
-    embedder = SentenceTransformer(MODEL_NAME)
+    col = _get_collection()
 
-    ev = build_evidence(transaction_id)
+    ev = fetch_query_fields(transaction_id)
+    if ev is None:
+        ev = build_evidence(transaction_id)
     query_parts = [
         f"amount={ev.get('amount')}",
         f"ProductCD={ev.get('ProductCD')}",
@@ -130,7 +299,7 @@ def retrieve_similar(transaction_id: int, top_k: int = 5):
     ]
     query_text = " | ".join([p for p in query_parts if p is not None])
 
-    query_emb = embedder.encode([query_text]).tolist()
+    query_emb = _encode([query_text]).tolist()
 
     res = col.query(query_embeddings=query_emb, n_results=int(top_k) + 1)
 
@@ -157,7 +326,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--fraud", type=int, default=2000)
     parser.add_argument("--nonfraud", type=int, default=2000)
-    parser.add_argument("--batch", type=int, default=128)
+    parser.add_argument("--batch", type=int, default=256)
     parser.add_argument("--rebuild", action="store_true")
     parser.add_argument("--test_id", type=int, default=3213699)
     args = parser.parse_args()
@@ -0,0 +1,73 @@
+import random
+
+# Run from the repo root: python -m src.test_decide_action (or pytest)
+from src.agent_orchestrator import SignalResult, _decide_action
+
+
+def _decide_action_reference(proba, signals, close_rate, close_count) -> str:
+    # POLICY v9 as the original if-chain; _ACTION_TABLE must agree with it.
+    score = int(getattr(signals, "signal_score", 0))
+    identity_missing_heavy = bool(getattr(signals, "identity_missing_heavy", False))
+    email_mismatch = bool(getattr(signals, "email_mismatch", False))
+    velocity_risk = bool(getattr(signals, "high_velocity_10m", False)) or bool(
+        getattr(signals, "high_velocity_1h", False)
+    )
+    high_amount = bool(getattr(signals, "high_amount", False))
+
+    score_wo_identity = score - (1 if identity_missing_heavy else 0)
+
+    strong_rules = (score_wo_identity >= 2) or email_mismatch or velocity_risk or high_amount
+
+    neighbor_ok = (close_rate is not None) and (int(close_count) >= 5)
+
+    if proba >= 0.97:
+        return "block"
+    if neighbor_ok and proba >= 0.92 and close_rate >= 0.90:
+        return "block"
+
+    if proba >= 0.70:
+        return "review"
+
+    if neighbor_ok and proba >= 0.60 and close_rate >= 0.90:
+        return "review"
+
+    if proba >= 0.60 and strong_rules:
+        return "review"
+
+    return "allow"
+
+
+def _random_case(rng: random.Random):
+    # Mix uniform values with the exact policy thresholds so boundaries get hit.
+    proba = rng.choice([rng.random(), 0.60, 0.70, 0.92, 0.97, 0.5999, 0.9699])
+    close_rate = rng.choice([None, rng.random(), 0.90, 0.8999, 1.0, 0.0])
+    close_count = rng.choice([0, 4, 5, 6, rng.randint(0, 20)])
+    flags = [rng.random() < 0.3 for _ in range(5)]
+    signals = SignalResult(
+        high_amount=flags[0],
+        high_velocity_10m=flags[1],
+        high_velocity_1h=flags[2],
+        identity_missing_heavy=flags[3],
+        email_mismatch=flags[4],
+        signal_score=rng.randint(0, 7),
+        signal_reasons=[],
+    )
+    return proba, signals, close_rate, close_count
+
+
+def test_decide_action_matches_policy_chain():
+    rng = random.Random(42)
+    mismatches = []
+    for _ in range(10000):
+        case = _random_case(rng)
+        got = _decide_action(*case)
+        want = _decide_action_reference(*case)
+        if got != want:
+            mismatches.append((case, got, want))
+
+    assert not mismatches, mismatches[:5]
+
+
+if __name__ == "__main__":
+    test_decide_action_matches_policy_chain()
+    print("ok")
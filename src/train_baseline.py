@@ -3,6 +3,9 @@ import joblib
 import duckdb
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
 
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import average_precision_score
@@ -10,6 +13,7 @@ from lightgbm import LGBMClassifier
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(PROJECT_ROOT, "data", "ieee.duckdb")
+PARQUET_PATH = os.path.join(PROJECT_ROOT, "data", "parquet", "train_joined.parquet")
 MODEL_DIR = os.path.join(PROJECT_ROOT, "models")
 os.makedirs(MODEL_DIR, exist_ok=True)
 
@@ -17,19 +21,41 @@ TARGET_COL = "isFraud"
 
 # -----------------------------
 # 1) Load a manageable sample
+#    Straight from the Parquet export (ingest_duckdb.py) through Arrow when
+#    it exists; otherwise from DuckDB.
 # -----------------------------
-con = duckdb.connect(DB_PATH)
-
-df = con.execute(
-    """
-    SELECT *
-    FROM train_joined
-    WHERE isFraud IS NOT NULL
-    LIMIT 500000
-    """
-).df()
-
-con.close()
+SAMPLE_ROWS = 500000
+
+if os.path.exists(PARQUET_PATH):
+    # The scanner applies the filter per batch and stops after SAMPLE_ROWS,
+    # so neither the whole file nor a filtered copy of it is materialized.
+    tbl = ds.dataset(PARQUET_PATH, format="parquet").head(
+        SAMPLE_ROWS,
+        filter=pc.field(TARGET_COL).is_valid(),
+        use_threads=True,
+    )
+    # split_blocks + self_destruct free Arrow buffers as columns convert, so
+    # the table and the frame are not both fully in memory. Nullable
+    # booleans stay boolean (not object) for the encoding below.
+    df = tbl.to_pandas(
+        split_blocks=True,
+        self_destruct=True,
+        types_mapper={pa.bool_(): pd.BooleanDtype()}.get,
+    )
+    del tbl
+else:
+    con = duckdb.connect(DB_PATH)
+
+    df = con.execute(
+        f"""
+        SELECT *
+        FROM train_joined
+        WHERE isFraud IS NOT NULL
+        LIMIT {SAMPLE_ROWS}
+        """
+    ).df()
+
+    con.close()
 
 # -----------------------------
 # 2) Split X / y
@@ -45,7 +71,7 @@ X = df.drop(columns=drop_cols)
 # -----------------------------
 # 3) Type-safe preprocessing
 #    - booleans -> Int (0/1/-1)
-#    - objects -> category codes
+#    - objects -> pandas categoricals (LightGBM native categorical splits)
 #    - fill remaining missing with -1
 # -----------------------------
 bool_cols = [c for c in X.columns if str(X[c].dtype) == "boolean" or X[c].dtype == bool]
@@ -54,10 +80,13 @@ for c in bool_cols:
     # Convert to nullable int so we can fill NA with -1
     X[c] = X[c].astype("Int8").fillna(-1)
 
-obj_cols = [c for c in X.columns if X[c].dtype == "object"]
+obj_cols = [c for c in X.columns if X[c].dtype == "object" or pd.api.types.is_string_dtype(X[c].dtype)]
+cat_maps = {}
 for c in obj_cols:
-    # Missing becomes -1 after cat.codes
-    X[c] = X[c].astype("category").cat.codes
+    # Missing stays NaN; LightGBM routes it as its own branch
+    X[c] = X[c].astype("category")
+    # Saved so inference builds categoricals with the same categories
+    cat_maps[c] = X[c].cat.categories
 
 # For any remaining nullable numeric types, keep numeric where possible
 for c in X.columns:
@@ -65,7 +94,8 @@ for c in X.columns:
         # Do not force-convert if it is already numeric; errors='ignore' keeps types stable
         X[c] = pd.to_numeric(X[c], errors="ignore")
 
-X = X.fillna(-1)
+num_cols = [c for c in X.columns if c not in obj_cols]
+X[num_cols] = X[num_cols].fillna(-1)
 
 # -----------------------------
 # 4) Train/validation split
@@ -88,7 +118,7 @@ model = LGBMClassifier(
     n_jobs=-1
 )
 
-model.fit(X_train, y_train)
+model.fit(X_train, y_train, categorical_feature=obj_cols)
 
 # -----------------------------
 # 6) Evaluate with PR-AUC
@@ -103,6 +133,8 @@ print("Average Precision (PR-AUC):", round(ap, 6))
 artifact = {
     "model": model,
     "columns": list(X.columns),
+    "cat_maps": cat_maps,
+    "native_categorical": True,
     "sample_rows": len(df)
 }
 
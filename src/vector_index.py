@@ -0,0 +1,173 @@
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Similar-case embeddings + metadata written next to the Chroma store by
+# similar_cases.py, so compact in-process indexes can be built from them.
+# Index rows line up with the cases file rows.
+CASES_SUFFIX = ".cases.npz"
+IVFPQ_SUFFIX = ".ivfpq.faiss"
+
+# Popcount of every byte value, for Hamming distance on packed codes.
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def cases_path(chroma_path: str, collection_name: str) -> str:
+    return os.path.join(chroma_path, f"{collection_name}{CASES_SUFFIX}")
+
+
+def ivfpq_path(chroma_path: str, collection_name: str) -> str:
+    return os.path.join(chroma_path, f"{collection_name}{IVFPQ_SUFFIX}")
+
+
+def save_cases(
+    path: str,
+    ids: List[int],
+    labels: List[int],
+    documents: List[str],
+    embeddings: np.ndarray,
+) -> None:
+    np.savez(
+        path,
+        ids=np.asarray(ids, dtype=np.int64),
+        labels=np.asarray(labels, dtype=np.int8),
+        documents=np.asarray(documents, dtype=str),
+        embeddings=np.asarray(embeddings, dtype=np.float32),
+    )
+
+
+def load_cases(path: str) -> Dict[str, np.ndarray]:
+    with np.load(path) as data:
+        return {k: data[k] for k in ("ids", "labels", "documents", "embeddings")}
+
+
+def _neighbor_rows(cases: Dict[str, np.ndarray], idx: np.ndarray, dists: np.ndarray) -> List[Dict[str, Any]]:
+    # Same row shape the Chroma path produces in agent_orchestrator.
+    return [
+        {
+            "transaction_id": int(cases["ids"][i]),
+            "label": int(cases["labels"][i]),
+            "document": str(cases["documents"][i]),
+            "distance": float(d),
+        }
+        for i, d in zip(idx, dists)
+    ]
+
+
+class BinaryIndex:
+    """
+    Binary quantized index: one bit per dimension (component above the corpus
+    mean), packed 8 per byte. A query scans the packed codes by Hamming
+    distance, keeps top_k * rerank_factor candidates and re-ranks them with
+    exact squared L2 on the fp32 vectors, so distances match Chroma's "l2"
+    space and max_distance keeps its meaning.
+    """
+
+    def __init__(self, cases: Dict[str, np.ndarray], rerank_factor: int = 20):
+        self.cases = cases
+        self.embeddings = np.ascontiguousarray(cases["embeddings"], dtype=np.float32)
+        self.mean = self.embeddings.mean(axis=0)
+        self.codes = np.packbits(self.embeddings > self.mean, axis=1)
+        self.rerank_factor = int(rerank_factor)
+
+    @classmethod
+    def load(cls, path: str, rerank_factor: int = 20) -> "BinaryIndex":
+        return cls(load_cases(path), rerank_factor=rerank_factor)
+
+    def _hamming(self, qcode: np.ndarray) -> np.ndarray:
+        return _POPCOUNT[self.codes ^ qcode].sum(axis=1, dtype=np.int32)
+
+    def query_cases(self, queries: np.ndarray, top_k: int) -> List[List[Dict[str, Any]]]:
+        n = len(self.embeddings)
+        k = min(int(top_k), n)
+        shortlist = min(n, k * self.rerank_factor)
+        qcodes = np.packbits(queries > self.mean, axis=1)
+
+        out: List[List[Dict[str, Any]]] = []
+        for q, qcode in zip(queries, qcodes):
+            if k <= 0:
+                out.append([])
+                continue
+            cand = np.argpartition(self._hamming(qcode), shortlist - 1)[:shortlist]
+            diff = self.embeddings[cand] - q
+            d = np.einsum("ij,ij->i", diff, diff)
+            order = np.argsort(d)[:k]
+            out.append(_neighbor_rows(self.cases, cand[order], d[order]))
+        return out
+
+
+class IVFPQIndex:
+    """
+    FAISS IVF + product quantization index over the cases file. Vectors are
+    assigned to nlist coarse cells and stored as m-byte PQ codes; a query
+    scans only the nprobe closest cells for top_k * rerank_factor candidates,
+    which are re-ranked with exact squared L2 (Chroma's "l2" space) on the
+    fp32 vectors. Needs the optional faiss package.
+    """
+
+    def __init__(
+        self,
+        index: Any,
+        cases: Dict[str, np.ndarray],
+        nprobe: int = 16,
+        rerank_factor: int = 4,
+    ):
+        self.index = index
+        self.cases = cases
+        self.embeddings = np.ascontiguousarray(cases["embeddings"], dtype=np.float32)
+        self.index.nprobe = int(nprobe)
+        self.rerank_factor = int(rerank_factor)
+
+    @classmethod
+    def build(cls, cases: Dict[str, np.ndarray], nlist: int = 1024, nbits: int = 8) -> "IVFPQIndex":
+        import faiss
+
+        xb = np.ascontiguousarray(cases["embeddings"], dtype=np.float32)
+        n, d = xb.shape
+        if n < (1 << nbits):
+            raise ValueError(f"Need at least {1 << nbits} vectors to train IVF-PQ, got {n}")
+
+        # FAISS wants ~39 training points per coarse centroid.
+        nlist = max(1, min(int(nlist), n // 39))
+        # Sub-quantizers: d // 8 (8 dims per byte code), must divide d.
+        m = max(x for x in range(1, max(d // 8, 1) + 1) if d % x == 0)
+
+        quantizer = faiss.IndexFlatL2(d)
+        index = faiss.IndexIVFPQ(quantizer, d, nlist, m, int(nbits))
+        index.train(xb)
+        index.add(xb)
+        return cls(index, cases)
+
+    @classmethod
+    def load(cls, index_path: str, cases_file: str, nprobe: int = 16) -> "IVFPQIndex":
+        import faiss
+
+        index = faiss.read_index(index_path)
+        cases = load_cases(cases_file)
+        # Index row ids address cases file rows; a mismatch means one of the
+        # two files is left over from an earlier build.
+        if index.ntotal != len(cases["ids"]):
+            raise ValueError(
+                f"IVF-PQ index has {index.ntotal} vectors but the cases file has {len(cases['ids'])}"
+            )
+        return cls(index, cases, nprobe=nprobe)
+
+    def save(self, index_path: str) -> None:
+        import faiss
+
+        faiss.write_index(self.index, index_path)
+
+    def query_cases(self, queries: np.ndarray, top_k: int) -> List[List[Dict[str, Any]]]:
+        k = int(top_k)
+        xq = np.ascontiguousarray(queries, dtype=np.float32)
+        _, idx = self.index.search(xq, k * self.rerank_factor)
+
+        out: List[List[Dict[str, Any]]] = []
+        for q, i_row in zip(xq, idx):
+            cand = i_row[i_row >= 0]  # -1 pads rows when the probed cells run out
+            diff = self.embeddings[cand] - q
+            d = np.einsum("ij,ij->i", diff, diff)
+            order = np.argsort(d)[:k]
+            out.append(_neighbor_rows(self.cases, cand[order], d[order]))
+        return out